@@ -1,23 +1,62 @@
 import os
+import json
 import time
+import uuid
+import numpy
+import random
+import logging
+import functools
+import threading
+from collections import OrderedDict
+from contextlib import ExitStack, contextmanager
+from concurrent.futures import (
+    ALL_COMPLETED,
+    FIRST_COMPLETED,
+    Future,
+    ProcessPoolExecutor,
+    wait)
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import resource_tracker
 from PIL import Image
-from skimage import color, io
+from gevent import get_hub
+from gevent.event import AsyncResult
 from gevent.pywsgi import WSGIServer
+from werkzeug.middleware.proxy_fix import ProxyFix
 from werkzeug.utils import secure_filename
-from flask import Flask, request, render_template, url_for
-from wallgen import (
-    NbyNGradient,
+from flask import (
+    Flask,
+    Response,
+    abort,
+    g,
+    request,
+    render_template,
+    stream_with_context,
+    url_for)
+from wallgen import genPoly, genSmartPoints, nGradient, swirl_image
+from tools.backgrounds import backgrounds, makeBackground
+from tools.canvas import canvases
+from tools.picture import (
+    PictureTooLarge,
+    edgeProxy,
+    openPicture,
+    pictureSize)
+from tools.points import (
+    budgetPoints,
+    conditionPoints,
+    randomPoints,
+    triangulate)
+from tools.metrics import SIZE_BUCKETS, Registry
+from tools.profiler import Profile
+from tools.transport import BufferPool, encodedBound, frameBytes, writeImage
+from tools.shapes import (
     genDiamond,
     genHexagon,
     genIsometric,
-    genPoints,
-    genPoly,
-    genSmartPoints,
     genSquares,
     genTriangle,
-    nGradient,
-    random_gradient,
-    swirl_image)
+    polyCenters,
+    repaintPoly,
+    sampleColors)
 
 UPLOAD_FOLDER = os.path.join("static", "upload")
 ALLOWED_EXTENSIONS = set(['png', 'jpg', 'jpeg'])
@@ -26,6 +65,497 @@ app = Flask(__name__, static_url_path="/static")
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = 5 * 1024 * 1024
 
+# proxies in front of the app (1 behind the heroku router or a reverse
+# proxy) whose X-Forwarded-For is trusted for the client address. only set
+# it when there are, or clients can pick their own address
+PROXIES = int(os.environ.get("WALLGEN_PROXIES", 0))
+if PROXIES:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=PROXIES)
+
+# bound the work done by one /pic request
+PIC_SHORT_SIDE = 1080  # pictures are rendered at most this high or wide
+PIC_MAX_DECODE = 50000000  # pixels decoded, after JPEG draft scaling
+PIC_BUDGET = 2.0  # seconds, for smart points
+PIC_MAX_POINTS = 20000
+
+# triangulations of recent /poly renders, so that a palette change can
+# repaint the previous image instead of rendering it again
+MESH_CACHE_SIZE = 16
+meshes = OrderedDict()
+
+
+def remember_mesh(mesh_id, mesh):
+    meshes[mesh_id] = mesh
+    meshes.move_to_end(mesh_id)
+    while len(meshes) > MESH_CACHE_SIZE:
+        meshes.popitem(last=False)
+
+
+# seeded renders are deterministic, identical requests arriving together
+# share one render and its result is served again for a few seconds
+RESULT_TTL = 10  # seconds
+RESULT_CACHE_SIZE = 64
+in_flight = {}
+results = OrderedDict()
+
+
+def single_flight(key, produce):
+    """
+    produce() once for every key, callers with the same key wait for the
+    render in progress or get its recent result. key None renders always
+    """
+
+    if key is None:
+        return produce()
+
+    now = time.monotonic()
+    while results and next(iter(results.values()))[0] < now - RESULT_TTL:
+        results.popitem(last=False)
+    if key in results:
+        CACHE.inc(cache="result", result="hit")
+        return results[key][1]
+
+    pending = in_flight.get(key)
+    if pending is not None:
+        CACHE.inc(cache="result", result="coalesced")
+        return pending.get()  # raises if the render failed
+
+    CACHE.inc(cache="result", result="miss")
+    pending = in_flight[key] = AsyncResult()
+    try:
+        value = produce()
+    except Exception as e:
+        pending.set_exception(e)
+        raise
+    finally:
+        del in_flight[key]
+
+    pending.set(value)
+    results[key] = (time.monotonic(), value)
+    while len(results) > RESULT_CACHE_SIZE:
+        results.popitem(last=False)
+    return value
+
+
+def render_key(route, spec, *extra):
+    """ canonical form of a seeded render request """
+    if spec.get('seed') is None:
+        return None
+    return route + repr(sorted(spec.items())) + repr(extra)
+
+
+# renders run in a pool of processes and hand back the encoded image through
+# shared memory, or through the pool's pipe when there is no room for it.
+# 0 renders in the web process
+RENDER_WORKERS = int(os.environ.get("WALLGEN_WORKERS", os.cpu_count() or 1))
+workers = None
+buffers = BufferPool()
+
+# memory the idle canvases and the ready backgrounds of every render process
+# may hold together, split evenly between the processes
+CANVAS_MEMORY = int(os.environ.get("WALLGEN_CANVAS_MB", 512)) * 2**20
+BACKGROUND_MEMORY = int(os.environ.get("WALLGEN_BACKGROUND_MB", 256)) * 2**20
+canvases.limit = CANVAS_MEMORY // max(RENDER_WORKERS, 1)
+backgrounds.limit = BACKGROUND_MEMORY // max(RENDER_WORKERS, 1)
+pending_renders = 0
+pending_lock = threading.Lock()
+
+# renders one client can have in progress, more are refused with a 429
+CLIENT_RENDERS = int(os.environ.get("WALLGEN_CLIENT_RENDERS", 2))
+client_renders = {}
+
+
+def render_pool():
+    global workers
+    if workers is None:
+        # workers forked before the tracker runs start trackers of their
+        # own, which unlink the buffers they opened when they exit
+        resource_tracker.ensure_running()
+        workers = ProcessPoolExecutor(RENDER_WORKERS)
+    return workers
+
+
+def drop_pool(pool):
+    """
+    a worker of pool died (killed for its memory, a crash), which breaks
+    the whole pool. the next render starts a new one
+    """
+    global workers
+    if workers is pool:
+        workers = None
+        RESTARTS.inc()
+        app.logger.warning("A render worker died, restarting the pool")
+    pool.shutdown(wait=False)
+
+
+@contextmanager
+def client_slot():
+    """ hold one of the renders of the client, abort when it has none """
+    client = request.remote_addr
+    if client_renders.get(client, 0) >= CLIENT_RENDERS:
+        BUSY.inc()
+        abort(429)
+
+    client_renders[client] = client_renders.get(client, 0) + 1
+    try:
+        yield
+    finally:
+        client_renders[client] -= 1
+        if not client_renders[client]:
+            del client_renders[client]
+
+
+@contextmanager
+def render(fn, nbytes, *args):
+    """
+    run fn(buffer name, *args) in a render worker. it encodes its image
+    into the buffer and returns (frame, profile, result). yields a
+    memoryview of the image, the profile and the result
+    """
+
+    with client_slot():
+        shm = buffers.take(nbytes)
+        try:
+            frame, prof, result = run_render(fn, shm and shm.name, *args)
+            data = frameBytes(shm, frame)
+            try:
+                yield data, prof, result
+            finally:
+                data.release()
+        finally:
+            buffers.give(shm)
+
+
+def submit_render(fn, *args):
+    """ future of fn(*args), run right away when there are no workers """
+    if RENDER_WORKERS:
+        pool = render_pool()
+        try:
+            future = pool.submit(fn, *args)
+        except BrokenProcessPool:
+            drop_pool(pool)
+            pool = render_pool()
+            future = pool.submit(fn, *args)
+        future.pool = pool  # the pool to drop if it breaks meanwhile
+        count_pending(1)
+        future.add_done_callback(lambda f: count_pending(-1))
+        return future
+
+    future = Future()
+    try:
+        future.set_result(fn(*args))
+    except Exception as e:
+        future.set_exception(e)
+    return future
+
+
+def count_pending(change):
+    """ renders past the number of workers are waiting for one """
+    global pending_renders
+    with pending_lock:
+        pending_renders += change
+        QUEUED.set(max(pending_renders - RENDER_WORKERS, 0))
+
+
+def wait_renders(futures, return_when=FIRST_COMPLETED):
+    """ wait in a thread so the other requests keep being served """
+    return get_hub().threadpool.apply(wait, (futures,),
+                                      dict(return_when=return_when))
+
+
+def run_render(fn, *args):
+    """ fn(*args) in a worker, tried again once if the pool broke """
+    for retry in (True, False):
+        future = submit_render(fn, *args)
+        wait_renders([future])
+        try:
+            return future.result()
+        except BrokenProcessPool:
+            drop_pool(future.pool)
+            if not retry:
+                abort(503)
+
+
+app.logger.setLevel(logging.INFO)
+
+metrics = Registry()
+REQUESTS = metrics.counter(
+    "wallgen_requests_total", "Requests handled, by route and status")
+LATENCY = metrics.histogram(
+    "wallgen_request_duration_seconds", "Request latency, by route")
+STAGES = metrics.histogram(
+    "wallgen_render_stage_duration_seconds",
+    "Time spent in each render stage, by route")
+IN_PROGRESS = metrics.gauge(
+    "wallgen_requests_in_progress", "Requests being handled right now")
+QUEUED = metrics.gauge(
+    "wallgen_renders_queued", "Renders submitted but waiting for a worker")
+CACHE = metrics.counter(
+    "wallgen_cache_requests_total", "Cache lookups, by cache and result")
+OUTPUT_BYTES = metrics.counter(
+    "wallgen_output_bytes_total",
+    "Bytes of images made, by where they went: written to static/images "
+    "(file) or streamed in a batch response (batch)")
+UPLOAD_BYTES = metrics.histogram(
+    "wallgen_upload_bytes", "Size of uploaded pictures", SIZE_BUCKETS)
+RESTARTS = metrics.counter(
+    "wallgen_render_pool_restarts_total",
+    "Render pools started again after one of their workers died")
+BUSY = metrics.counter(
+    "wallgen_renders_refused_total",
+    "Renders refused because the client had too many in progress")
+
+
+@app.before_request
+def start_request():
+    g.start = time.perf_counter()
+    IN_PROGRESS.inc()
+
+
+@app.after_request
+def count_request(response):
+    route = request.url_rule.rule if request.url_rule else "none"
+    REQUESTS.inc(route=route, method=request.method,
+                 status=response.status_code)
+    if not g.get("streamed"):
+        # streamed bodies are only made after this, see finish_stream
+        LATENCY.observe(time.perf_counter() - g.start, route=route)
+    return response
+
+
+def finish_stream(response, *closers):
+    """ record the latency of a streamed response once it is sent """
+    g.streamed = True
+    start = g.start
+    route = request.url_rule.rule
+
+    def close():
+        for closer in closers:
+            closer()
+        LATENCY.observe(time.perf_counter() - start, route=route)
+
+    response.call_on_close(close)
+    return response
+
+
+@app.teardown_request
+def end_request(exc):
+    IN_PROGRESS.dec()
+
+
+@app.errorhandler(503)
+def renders_failed(e):
+    error = "The renderer stopped, try again"
+    return render_template("error.html", context=error), 503
+
+
+@app.errorhandler(429)
+def too_many_renders(e):
+    error = "Too many images in progress, wait for them to finish"
+    return render_template("error.html", context=error), 429
+
+
+def log_profile(prof):
+    """ log where the time of a render went, and export it as metrics """
+    app.logger.info("%s total=%.0fms %s", request.path,
+                    prof.total() * 1000, prof.line())
+    for stage, seconds in prof.durations().items():
+        STAGES.observe(seconds, route=request.path, stage=stage)
+
+
+def output_name():
+    """ renders finishing in the same second must not share a file """
+    return "wall-{}-{}.png".format(int(time.time()), uuid.uuid4().hex[:8])
+
+
+def save_image(data, fpath, prof):
+    with prof.stage("write"):
+        with open(fpath, "wb") as f:
+            f.write(data)
+    OUTPUT_BYTES.inc(len(data), to="file")
+
+
+def encode_image(name, img, prof):
+    """ encode the finished image, its canvas goes back to the pool """
+    with prof.stage("save"):
+        frame = writeImage(name, img)
+    canvases.give(img)
+    return frame
+
+
+def background(side, spec, prof):
+    """
+    the gradient a render starts from. random ones come ready made from
+    the background pool, unless the render is seeded
+    """
+
+    if spec['bgtype'] != "customColors":
+        kind = "nbyn" if spec['bgtype'] == "nbyn" else "random"
+        img = None
+        if spec.get('seed') is None:
+            with prof.stage("gradient"):
+                img = backgrounds.take((kind, side))
+        if img is None:
+            with prof.stage("gradient"):
+                img = makeBackground(kind, side)
+    else:
+        with prof.stage("gradient"):
+            img = nGradient(side, *spec['colors'])
+
+    if spec['swirl']:
+        with prof.stage("swirl"):
+            swirled = swirl_image(img)
+        canvases.give(img)
+        img = swirled
+    return img
+
+
+def form_seed():
+    """ optional seed of the render, raises ValueError """
+    seed = request.form.get('seed')
+    if not seed:
+        return None
+    return int(seed) % 2**32
+
+
+def seed_render(spec):
+    """
+    seed both generators, from the os when no seed was asked for, so
+    forked workers do not repeat each other's numpy sequence
+    """
+    random.seed(spec.get('seed'))
+    numpy.random.seed(spec.get('seed'))
+
+
+def form_colors():
+    """ colors of a customColors form, raises ValueError """
+    nColors = request.form.get('nColors')
+    colors = []
+
+    for i in range(int(nColors)):
+        colors.append(request.form.get('rgb' + str(i + 1)))
+
+    return [tuple(bytes.fromhex(x[1:])) for x in colors]
+
+
+def worker(fn):
+    """ render in a worker, background refills wait while it runs """
+    @functools.wraps(fn)
+    def wrapper(*args):
+        with backgrounds.busy():
+            return fn(*args)
+    return wrapper
+
+
+@worker
+def render_poly(name, spec, mesh=None):
+    """ runs in a render worker """
+    side = spec['side']
+    shift = side // 10
+    nside = side + shift * 2  # increase size to prevent underflow
+
+    seed_render(spec)
+    prof = Profile()
+    img = background(nside, spec, prof)
+
+    if mesh is not None:
+        # same geometry, only the palette changed
+        with prof.stage("fill"):
+            colors = sampleColors(img, mesh['centers'])
+            canvases.give(img)
+            img = Image.open(mesh['path']).convert("RGB")
+            repaintPoly(img, mesh['points'], mesh['colors'], colors,
+                        shift, shift, outl=spec['outline'])
+        mesh = None
+    else:
+        stats = {}
+        with prof.stage("points"):
+            pts = conditionPoints(randomPoints(spec['np'], nside, nside),
+                                  stats=stats)
+        prof.count("removed", stats['removed'])
+        with prof.stage("triangulation"):
+            pts = triangulate(pts)
+        with prof.stage("fill"):
+            centers = polyCenters(pts, side, side, shift, shift)
+            colors = sampleColors(img, centers)
+            poly = genPoly(side, side, img, pts, shift, shift,
+                           outl=spec['outline'], colors=colors)
+        canvases.give(img)
+        img = poly
+        mesh = dict(points=pts, centers=centers)
+
+    return encode_image(name, img, prof), prof, dict(mesh=mesh, colors=colors)
+
+
+SHAPE_FUNCTIONS = dict(
+    hexagon=genHexagon,
+    squares=genSquares,
+    diamond=genDiamond,
+    triangle=genTriangle,
+    isometric=genIsometric)
+
+
+@worker
+def render_shape(name, spec):
+    """ runs in a render worker """
+    side = spec['side']
+
+    seed_render(spec)
+    prof = Profile()
+    img = background(side, spec, prof)
+
+    with prof.stage("fill"):
+        fn = SHAPE_FUNCTIONS.get(spec['shape'])
+        if fn:
+            img = fn(side, side, img, spec['outline'], per=5)
+
+    return encode_image(name, img, prof), prof, None
+
+
+@worker
+def render_pic(name, spec):
+    """ runs in a render worker """
+    prof = Profile()
+    with prof.stage("open"):
+        # decoded once, colours and edges both come from this copy
+        img = openPicture(spec['path'], short_side=PIC_SHORT_SIDE,
+                          max_decode=PIC_MAX_DECODE)
+        img.load()
+    width = img.width
+    height = img.height
+    wshift = width // 100
+    hshift = height // 100
+
+    n_width = width + 2 * wshift
+    n_height = height + 2 * hshift
+
+    if spec['smart']:
+        stats = {}
+        with prof.stage("proxy"):
+            gray_img = edgeProxy(img)
+        pts = genSmartPoints(
+            gray_img, size=(width, height), stats=stats,
+            qty=min(budgetPoints(PIC_BUDGET, width, height),
+                    spec['np'] or PIC_MAX_POINTS))
+        prof.add("edges", stats['edges'])
+        prof.add("points", stats['sample'])
+        prof.add("triangulation", stats['delaunay'])
+        prof.count("removed", stats['removed'])
+    else:
+        stats = {}
+        with prof.stage("points"):
+            pts = conditionPoints(randomPoints(spec['np'], n_width, n_height),
+                                  stats=stats)
+        prof.count("removed", stats['removed'])
+        with prof.stage("triangulation"):
+            pts = triangulate(pts)
+
+    with prof.stage("fill"):
+        img = genPoly(img.width, img.height, img, pts,
+                      wshift, hshift, spec['outline'], pic=True)
+
+    return encode_image(name, img, prof), prof, None
+
 
 def allowed_file(filename):
     return '.' in filename and \
@@ -37,6 +567,12 @@ def index():
     return render_template("home.html")
 
 
+@app.route("/metrics", methods=['GET'])
+def metrics_page():
+    return Response(metrics.expose(),
+                    mimetype="text/plain; version=0.0.4; charset=utf-8")
+
+
 @app.route("/poly", methods=['GET', 'POST'])
 def poly():
     if request.method == 'POST':
@@ -54,31 +590,22 @@ def poly():
         if np < 10 or np > 10001:
             error = "WARNING: Too less points OR too many points"
 
-        fname = "wall-{}.png".format(int(time.time()))
-        fpath = 'static/images/' + fname
-
-        shift = side // 10
-        nside = side + shift * 2  # increase size to prevent underflow
-
-        img = random_gradient(nside)
+        try:
+            seed = form_seed()
+        except ValueError:
+            error = "ERROR: Invalid seed"
 
-        if bgtype == "nbyn":
-            img = NbyNGradient(nside)
-        elif bgtype == "customColors":
-            nColors = request.form.get('nColors')
-            colors = []
-
-            for i in range(int(nColors)):
-                colors.append(request.form.get('rgb' + str(i + 1)))
+        fname = output_name()
+        fpath = 'static/images/' + fname
 
+        colors = None
+        if bgtype == "customColors":
             try:
-                colors = [tuple(bytes.fromhex(x[1:])) for x in colors]
+                colors = form_colors()
             except Exception as e:
                 print(e)
                 error = "ERROR: Invalid color hex"
 
-            img = nGradient(nside, *colors)
-
         if error is not None:
             print(error)
             return render_template('error.html', context=error)
@@ -88,19 +615,47 @@ def poly():
         else:
             outline = None
 
-        if swirl:
-            img = swirl_image(img)
-
-        pts = genPoints(np, nside, nside)
-        img = genPoly(side, side, img, pts, shift, shift, outl=outline)
-
-        # print(fpath)
-        img.save(fpath)
+        spec = dict(side=side, np=np, outline=outline, bgtype=bgtype,
+                    colors=colors, swirl=bool(swirl), seed=seed)
+
+        mesh_id = request.form.get('mesh')
+        mesh = meshes.get(mesh_id)
+        if mesh is not None:
+            if (mesh['side'], mesh['np'], mesh['outline']) != \
+                    (side, np, outline) or not os.path.exists(mesh['path']):
+                mesh = None
+        if mesh_id:
+            CACHE.inc(cache="mesh", result="miss" if mesh is None else "hit")
+
+        def produce():
+            with render(render_poly, encodedBound(side, side), spec,
+                        mesh) as (data, prof, result):
+                # print(fpath)
+                save_image(data, fpath, prof)
+            log_profile(prof)
+
+            new_id, new_mesh = mesh_id, mesh
+            if result['mesh'] is not None:
+                new_id = uuid.uuid4().hex
+                new_mesh = dict(result['mesh'], side=side, np=np,
+                                outline=outline)
+            remember_mesh(new_id, dict(new_mesh, colors=result['colors'],
+                                       path=fpath))
+            return fname, new_id
+
+        key = render_key("poly", spec, mesh_id if mesh is not None else None)
+        fname, mesh_id = single_flight(key, produce)
 
         imgurl = url_for('static', filename='images/' + fname)
-        return render_template("download.html", context=imgurl, home="poly")
+        return render_template("download.html", context=imgurl, home="poly",
+                               mesh=mesh_id)
     else:
-        return render_template('poly.html')
+        mesh_id = request.args.get('mesh')
+        mesh = meshes.get(mesh_id)
+        if mesh is None:
+            return render_template('poly.html')
+        return render_template('poly.html', mesh=mesh_id,
+                               side=mesh['side'], np=mesh['np'])
 
 
 @app.route("/shape", methods=['GET', 'POST'])
@@ -117,28 +672,22 @@ def shape():
         if side > 5000 or side < 100:
             error = "WARNING: Image too large OR Image too small"
 
-        fname = "wall-{}.png".format(int(time.time()))
-        fpath = 'static/images/' + fname
-
-        img = random_gradient(side)
+        try:
+            seed = form_seed()
+        except ValueError:
+            error = "ERROR: Invalid seed"
 
-        if bgtype == "nbyn":
-            img = NbyNGradient(side)
-        elif bgtype == "customColors":
-            nColors = request.form.get('nColors')
-            colors = []
-
-            for i in range(int(nColors)):
-                colors.append(request.form.get('rgb' + str(i + 1)))
+        fname = output_name()
+        fpath = 'static/images/' + fname
 
+        colors = None
+        if bgtype == "customColors":
             try:
-                colors = [tuple(bytes.fromhex(x[1:])) for x in colors]
+                colors = form_colors()
             except Exception as e:
                 print(e)
                 error = "ERROR: Invalid color hex"
 
-            img = nGradient(side, *colors)
-
         if error is not None:
             print(error)
             return render_template('error.html', context=error)
@@ -148,21 +697,18 @@ def shape():
         else:
             outline = None
 
-        if swirl:
-            img = swirl_image(img)
-
-        if shape == 'hexagon':
-            img = genHexagon(side, side, img, outline, per=5)
-        elif shape == 'squares':
-            img = genSquares(side, side, img, outline, per=5)
-        elif shape == 'diamond':
-            img = genDiamond(side, side, img, outline, per=5)
-        elif shape == 'triangle':
-            img = genTriangle(side, side, img, outline, per=5)
-        elif shape == 'isometric':
-            img = genIsometric(side, side, img, outline, per=5)
-        # print(fpath)
-        img.save(fpath)
+        spec = dict(side=side, outline=outline, bgtype=bgtype,
+                    colors=colors, swirl=bool(swirl), shape=shape, seed=seed)
+
+        def produce():
+            with render(render_shape, encodedBound(side, side),
+                        spec) as (data, prof, _):
+                # print(fpath)
+                save_image(data, fpath, prof)
+            log_profile(prof)
+            return fname
+
+        fname = single_flight(render_key("shape", spec), produce)
         imgurl = url_for('static', filename='images/' + fname)
         return render_template("download.html", context=imgurl, home="shape")
     else:
@@ -189,50 +735,54 @@ def pic():
                 filename = secure_filename(file.filename)
                 ufpath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
                 file.save(ufpath)
+                UPLOAD_BYTES.observe(os.path.getsize(ufpath))
                 np = request.form.get('np')
                 outline = request.form.get('outline')
                 smart = request.form.get('smart')
 
                 if np or smart:
-                    og_img = Image.open(ufpath)
-                    width = og_img.width
-                    height = og_img.height
-
-                    if min(height, width) > 1080:
-                        scale = min(height, width) // 1080
-                    else:
-                        scale = 1
-                    img = og_img.resize(
-                        (width // scale, height // scale),
-                        resample=Image.BICUBIC)
-                    width = img.width
-                    height = img.height
-                    wshift = width // 100
-                    hshift = height // 100
-
-                    n_width = width + 2 * wshift
-                    n_height = height + 2 * height
+                    try:
+                        np = int(np or 0)
+                    except ValueError:
+                        error = "ERROR: Invalid number of points"
+                        return render_template("error.html", context=error)
+                    # smart renders take np as a cap on their budget
+                    if (np or not smart) and \
+                            (np < 10 or np > PIC_MAX_POINTS):
+                        error = "WARNING: Too less points OR too many points"
+                        return render_template("error.html", context=error)
 
                     if outline:
                         outline = tuple(bytes.fromhex("#2c2c2c"[1:]))
                     else:
                         outline = None
 
-                    if smart:
-                        ski_img = io.imread(ufpath, True)
-                        gray_img = color.rgb2gray(ski_img)
-                        pts = genSmartPoints(gray_img)
-                    else:
-                        pts = genPoints(int(np), n_width, n_height)
-
-                    img = genPoly(img.width, img.height, img, pts,
-                                  wshift, hshift, outline, pic=True)
-
-                    fname = "wall-{}.png".format(int(time.time()))
+                    # the size the worker shrinks the picture to, read from
+                    # its header. too large pictures never get a buffer
+                    try:
+                        width, height = pictureSize(
+                            ufpath, short_side=PIC_SHORT_SIDE,
+                            max_decode=PIC_MAX_DECODE)
+                    except PictureTooLarge as e:
+                        return render_template("error.html", context=str(e))
+                    except OSError:
+                        error = "Not a picture, try again"
+                        return render_template("error.html", context=error)
+
+                    spec = dict(path=ufpath, np=np, smart=smart,
+                                outline=outline)
+
+                    fname = output_name()
                     fpath = 'static/images/' + fname
 
-                    # print(fpath)
-                    img.save(fpath)
+                    try:
+                        with render(render_pic, encodedBound(width, height),
+                                    spec) as (data, prof, _):
+                            # print(fpath)
+                            save_image(data, fpath, prof)
+                    except PictureTooLarge as e:
+                        return render_template("error.html", context=str(e))
+                    log_profile(prof)
                     imgurl = url_for('static', filename='images/' + fname)
                     return render_template(
                         "download.html", context=imgurl, home="pic")
@@ -246,6 +796,152 @@ def pic():
         return render_template("pic.html")
 
 
+# most renders in one /api/batch request
+BATCH_SIZE = 16
+
+
+def batch_render(item):
+    """ render function and spec of one /api/batch item, raises ValueError """
+    if not isinstance(item, dict):
+        raise ValueError("every render must be an object")
+
+    side = int(item.get('side', 1000))
+    if side > 5000 or side < 100:
+        raise ValueError("side must be between 100 and 5000")
+
+    bgtype = item.get('bgtype', "random")
+    colors = None
+    if bgtype == "customColors":
+        try:
+            colors = [tuple(bytes.fromhex(c.lstrip("#")))
+                      for c in item.get('colors', [])]
+        except (ValueError, TypeError, AttributeError):
+            colors = []
+        if len(colors) < 2 or any(len(c) != 3 for c in colors):
+            raise ValueError("customColors needs two or more #rrggbb colors")
+    elif bgtype not in ("random", "nbyn"):
+        raise ValueError("bgtype must be random, nbyn or customColors")
+
+    seed = item.get('seed')
+    spec = dict(side=side, bgtype=bgtype, colors=colors,
+                outline=(44, 44, 44) if item.get('outline') else None,
+                swirl=bool(item.get('swirl')),
+                seed=None if seed is None else int(seed) % 2**32)
+
+    kind = item.get('type', "poly")
+    if kind == "poly":
+        spec['np'] = int(item.get('np', 100))
+        if spec['np'] < 10 or spec['np'] > 10001:
+            raise ValueError("np must be between 10 and 10001")
+        return render_poly, spec
+    elif kind == "shape":
+        spec['shape'] = item.get('shape', "hexagon")
+        if spec['shape'] not in SHAPE_FUNCTIONS:
+            raise ValueError("shape must be one of " +
+                             ", ".join(SHAPE_FUNCTIONS))
+        return render_shape, spec
+    raise ValueError("type must be poly or shape")
+
+
+def batch_part(boundary, index, future, shm):
+    """ one part of the multipart response, the image or the error """
+    try:
+        frame, prof, _ = future.result()
+    except Exception as e:
+        if isinstance(e, BrokenProcessPool):
+            drop_pool(future.pool)
+            e = "the renderer stopped, try again"
+        body = json.dumps(dict(index=index, error=str(e))).encode()
+        ctype = "application/json"
+    else:
+        log_profile(prof)
+        view = frameBytes(shm, frame)
+        body = bytes(view)
+        view.release()
+        OUTPUT_BYTES.inc(len(body), to="batch")
+        ctype = "image/png"
+
+    head = ("--{}\r\n"
+            "Content-Type: {}\r\n"
+            "Content-Disposition: attachment; name=\"{}\"; "
+            "filename=\"wall-{}.png\"\r\n"
+            "Content-Length: {}\r\n\r\n").format(
+                boundary, ctype, index, index, len(body))
+    return head.encode() + body + b"\r\n"
+
+
+def stream_batch(jobs, boundary):
+    """
+    render the jobs, a few at a time, and yield every result as soon as
+    it is ready, in whatever order they finish
+    """
+
+    queue = list(enumerate(jobs))
+    pending = {}
+    try:
+        while queue or pending:
+            while queue and len(pending) < CLIENT_RENDERS:
+                index, (fn, spec) = queue.pop(0)
+                shm = buffers.take(encodedBound(spec['side'], spec['side']))
+                pending[submit_render(fn, shm and shm.name, spec)] = \
+                    (index, shm)
+
+            done, _ = wait_renders(list(pending))
+            for future in done:
+                index, shm = pending.pop(future)
+                try:
+                    yield batch_part(boundary, index, future, shm)
+                finally:
+                    buffers.give(shm)
+
+        yield "--{}--\r\n".format(boundary).encode()
+    finally:
+        # the client went away, the buffers are only free once the
+        # workers stop writing into them
+        for future in pending:
+            future.cancel()
+        if pending:
+            wait_renders(list(pending), return_when=ALL_COMPLETED)
+        for index, shm in pending.values():
+            buffers.give(shm)
+
+
+@app.route("/api/batch", methods=['POST'])
+def api_batch():
+    """
+    render a list of poly and shape specs, the images are streamed back
+    as a multipart/mixed response in the order they finish
+    """
+
+    data = request.get_json(silent=True)
+    if isinstance(data, dict):
+        data = data.get('renders')
+    if not isinstance(data, list) or not data:
+        return Response(json.dumps(dict(error="expected a list of renders")),
+                        status=400, mimetype="application/json")
+    if len(data) > BATCH_SIZE:
+        error = "at most {} renders per batch".format(BATCH_SIZE)
+        return Response(json.dumps(dict(error=error)), status=400,
+                        mimetype="application/json")
+
+    try:
+        jobs = [batch_render(item) for item in data]
+    except (ValueError, TypeError) as e:
+        return Response(json.dumps(dict(error=str(e))), status=400,
+                        mimetype="application/json")
+
+    # the whole batch counts as one render of the client, and it never
+    # has more than CLIENT_RENDERS of its own running at once
+    slot = ExitStack()
+    slot.enter_context(client_slot())
+
+    boundary = uuid.uuid4().hex
+    response = Response(
+        stream_with_context(stream_batch(jobs, boundary)),
+        mimetype="multipart/mixed; boundary=" + boundary)
+    return finish_stream(response, slot.close)
+
+
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
     http_server = WSGIServer(('', port), app)
@@ -34,16 +34,21 @@ setup(name='wallgen',
           'License :: OSI Approved :: MIT License',
 
           'Programming Language :: Python :: 3',
-          'Programming Language :: Python :: 3.4',
-          'Programming Language :: Python :: 3.5',
-          'Programming Language :: Python :: 3.6',
+          'Programming Language :: Python :: 3.8',
+          'Programming Language :: Python :: 3.9',
+          'Programming Language :: Python :: 3.10',
+          'Programming Language :: Python :: 3.11',
       ],
 
       keywords='image PIL wallpaper theme',
       license='MIT',
       packages=find_packages(),
-      install_requires=['pillow', 'click', 'scipy',
-                        'numpy', 'Cython', 'scikit-image'],
+      # shared_memory needs 3.8, sliding_window_view numpy 1.20 and the
+      # Quantize and Dither enums pillow 9.1
+      python_requires='>=3.8',
+      install_requires=['pillow>=9.1', 'click', 'scipy',
+                        'numpy>=1.20', 'Cython', 'scikit-image'],
+      extras_require={'test': ['pytest', 'pytest-benchmark']},
       entry_points="""
     [console_scripts]
         wallgen=wallgen:cli
@@ -0,0 +1,57 @@
+import random
+from pathlib import Path
+
+import numpy as np
+import pytest
+from PIL import Image
+
+SEED = 42
+GOLDEN = Path(__file__).parent / "golden"
+
+# the golden images were rendered by the code before it was optimised, so
+# they pin the original output. how far a render may drift from them, in
+# 0-255 steps: the mean difference over every channel, and the share of
+# values off by more than LOOSE (edges can move by a pixel)
+MEAN_TOLERANCE = 1.0
+LOOSE = 32
+LOOSE_SHARE = 0.005
+
+
+def pytest_addoption(parser):
+    parser.addoption("--update-golden", action="store_true",
+                     help="Write the golden images again from this tree")
+
+
+@pytest.fixture(autouse=True)
+def seeded():
+    """ every test starts from the same random state """
+    random.seed(SEED)
+    np.random.seed(SEED)
+
+
+@pytest.fixture
+def golden(request):
+    """ compare(name, img) checks img against tests/golden/name.png """
+    update = request.config.getoption("--update-golden")
+
+    def compare(name, img, mean=MEAN_TOLERANCE, share=LOOSE_SHARE):
+        path = GOLDEN / "{}.png".format(name)
+        img = img.convert("RGB")
+        if update:
+            img.save(path, optimize=True)
+            return
+        if not path.exists():
+            pytest.fail("No golden image {}, run pytest with "
+                        "--update-golden".format(path.name))
+
+        want = Image.open(path).convert("RGB")
+        assert img.size == want.size, "size changed"
+        diff = np.abs(np.asarray(img, dtype=np.int16) -
+                      np.asarray(want, dtype=np.int16))
+        assert diff.mean() <= mean, \
+            "{} is {:.2f} off on average".format(name, diff.mean())
+        assert (diff > LOOSE).mean() <= share, \
+            "{} differs in {:.2%} of its values".format(
+                name, (diff > LOOSE).mean())
+
+    return compare
@@ -0,0 +1,85 @@
+import threading
+
+import numpy as np
+import pytest
+
+from tools import api
+
+
+def test_seeded_renders_repeat():
+    spec = api.PolySpec(side=200, points=300, seed=7)
+    first = api.render(spec)
+
+    assert first.shape == (200, 200, 3)
+    assert first.dtype == np.uint8
+    assert np.array_equal(first, api.render(spec))
+    assert not np.array_equal(first, api.render(spec._replace(seed=8)))
+
+
+@pytest.mark.parametrize("spec", [
+    api.PolySpec(side=150, colors=("#ff0000", (0, 0, 255)),
+                 outline="#222222", seed=1),
+    api.PolySpec(side=150, nbyn=True, swirl=3, scale=1, seed=1),
+    api.ShapeSpec(side=600, shape="dia", seed=1),
+    api.ShapeSpec(side=300, shape="hex", percent=3, workers=2, seed=1),
+    api.SlantsSpec(side=120, swirl=2, seed=1),
+])
+def test_render_specs(spec):
+    assert api.render(spec).shape == (spec.side, spec.side, 3)
+
+
+@pytest.mark.parametrize("picture", [
+    np.random.randint(0, 256, (180, 320, 3), dtype=np.uint8),
+    np.random.randint(0, 256, (180, 320, 4), dtype=np.uint8),
+    np.random.randint(0, 256, (180, 320), dtype=np.uint8),
+])
+def test_picture_renders(picture):
+    before = picture.copy()
+    for spec in (api.PicPolySpec(points=200, seed=3),
+                 api.PicPolySpec(points=200, sample="mean", seed=3),
+                 api.PicShapeSpec(shape="sq", percent=10)):
+        assert api.render(spec, picture).shape == (180, 320, 3)
+    assert np.array_equal(picture, before)
+
+
+def test_gray_picture_stays_gray():
+    picture = np.random.randint(0, 256, (120, 200), dtype=np.uint8)
+    for spec in (api.PicPolySpec(points=300, seed=3),
+                 api.PicShapeSpec(shape="hex", percent=5)):
+        out = api.render(spec, picture)
+        assert (out == out[..., :1]).all()
+
+
+def test_threads_match_serial():
+    specs = [api.PolySpec(side=200, points=200, seed=s) for s in range(6)]
+    serial = [api.render(spec) for spec in specs]
+    threaded = [None] * len(specs)
+
+    def run(i):
+        threaded[i] = api.render(specs[i])
+
+    threads = [threading.Thread(target=run, args=(i,))
+               for i in range(len(specs))]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert all(np.array_equal(a, b) for a, b in zip(serial, threaded))
+
+
+@pytest.mark.parametrize("spec, picture, error", [
+    (api.PolySpec(10), None, ValueError),
+    (api.PolySpec(200, points=1), None, ValueError),
+    (api.PolySpec(200, outline="#zz0000"), None, ValueError),
+    (api.PolySpec(200, colors=("#ff0000",)), None, ValueError),
+    (api.ShapeSpec(600, shape="circle"), None, ValueError),
+    (api.ShapeSpec(600, percent=11), None, ValueError),
+    (api.PicPolySpec(), None, ValueError),
+    (api.PicPolySpec(sample="mode"), np.zeros((9, 9, 3), np.uint8),
+     ValueError),
+    (api.PicShapeSpec(), np.zeros((9, 9), np.float32), ValueError),
+    ((100, 100), None, TypeError),
+])
+def test_invalid(spec, picture, error):
+    with pytest.raises(error):
+        api.render(spec, picture)
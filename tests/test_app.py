@@ -0,0 +1,74 @@
+import os
+
+import gevent
+import pytest
+
+os.environ["WALLGEN_WORKERS"] = "0"  # render in the test process
+
+import app  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def fresh_results():
+    app.results.clear()
+
+
+@pytest.fixture
+def client():
+    return app.app.test_client()
+
+
+def test_single_flight_coalesces():
+    calls = []
+
+    def produce():
+        calls.append(1)
+        gevent.sleep(0.05)
+        return "image"
+
+    waiters = [gevent.spawn(app.single_flight, "key", produce)
+               for _ in range(4)]
+    gevent.joinall(waiters)
+
+    assert [w.value for w in waiters] == ["image"] * 4
+    assert app.single_flight("key", produce) == "image"
+    assert len(calls) == 1
+    assert app.single_flight(None, produce) == "image"
+    assert len(calls) == 2
+
+
+def test_single_flight_failure():
+    def produce():
+        gevent.sleep(0.05)
+        raise ValueError("bad render")
+
+    waiters = [gevent.spawn(app.single_flight, "bad", produce)
+               for _ in range(3)]
+    gevent.joinall(waiters)
+
+    assert all(isinstance(w.exception, ValueError) for w in waiters)
+    assert "bad" not in app.results and "bad" not in app.in_flight
+
+
+def test_metrics(client):
+    client.get("/")
+    response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.mimetype == "text/plain"
+    assert "# TYPE wallgen_requests_total counter" in response.text
+    assert ('wallgen_requests_total{method="GET",route="/",status="200"}'
+            in response.text)
+
+
+def test_client_slot_busy(client):
+    app.client_renders["127.0.0.1"] = app.CLIENT_RENDERS
+    try:
+        response = client.post("/poly", data=dict(
+            side=200, np=100, bgtype="customColors", nColors=2,
+            rgb1="#ff0000", rgb2="#0000ff"))
+    finally:
+        del app.client_renders["127.0.0.1"]
+
+    assert response.status_code == 429
+    assert "wallgen_renders_refused_total 1" in client.get("/metrics").text
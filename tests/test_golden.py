@@ -0,0 +1,75 @@
+import numpy as np
+import pytest
+from PIL import Image
+
+from tools.gradient import (
+    NbyNGradient,
+    nGradient,
+    random_gradient,
+    swirl_image)
+from tools.points import randomPoints, triangulate
+from tools.shapes import SHAPES, drawSlants, genPoly
+
+SIDE = 300
+
+
+def test_random_gradient(golden):
+    golden("random_gradient", random_gradient(SIDE))
+
+
+def test_ngradient(golden):
+    golden("ngradient", nGradient(SIDE, (255, 0, 0), (0, 221, 255),
+                                  (20, 20, 20)))
+
+
+def test_nbyn_gradient(golden):
+    golden("nbyn_gradient", NbyNGradient(SIDE))
+
+
+def test_swirl(golden):
+    golden("swirl", swirl_image(NbyNGradient(SIDE), 5))
+
+
+def test_slants(golden):
+    # the stripes used to be drawn as wide lines, their anti aliased edges
+    # now fall up to a pixel away from where those had them
+    golden("slants", drawSlants(SIDE), mean=6, share=0.06)
+
+
+@pytest.mark.parametrize("outline", [None, (44, 44, 44)])
+def test_poly(golden, outline):
+    side = SIDE * 2
+    shift = side // 10
+    nside = side + shift * 2
+    img = random_gradient(nside)
+    mesh = triangulate(randomPoints(300, nside, nside))
+    img = genPoly(side, side, img, mesh, shift, shift, outl=outline)
+
+    name = "poly_outline" if outline else "poly"
+    golden(name, img.resize((SIDE, SIDE), resample=Image.BICUBIC))
+
+
+def test_pic_poly(golden):
+    picture = NbyNGradient(SIDE)
+    shift = SIDE // 100
+    mesh = triangulate(randomPoints(500, SIDE + 2 * shift, SIDE + 2 * shift))
+    golden("pic_poly", genPoly(SIDE, SIDE, picture, mesh, shift, shift,
+                               pic=True))
+
+
+@pytest.mark.parametrize("shape", sorted(SHAPES))
+def test_shape(golden, shape):
+    side = 1000  # squares and diamonds need 500 pixels at 1 percent
+    img = SHAPES[shape](side, side, NbyNGradient(side), (44, 44, 44), per=2)
+    golden("shape_" + shape, img.resize((SIDE, SIDE),
+                                        resample=Image.BICUBIC))
+
+
+def test_golden_catches_changes(golden, request):
+    if request.config.getoption("--update-golden"):
+        pytest.skip("would write the changed image as the golden one")
+    img = random_gradient(SIDE)
+    pixels = np.asarray(img).copy()
+    pixels[:, :SIDE // 4] = 255 - pixels[:, :SIDE // 4]
+    with pytest.raises(AssertionError):
+        golden("random_gradient", Image.fromarray(pixels))
@@ -9,4 +9,6 @@ wallgen shape --help
 echo wallgen slants --help
 wallgen slants --help
 echo wallgen pic --help
-wallgen pic --help
\ No newline at end of file
+wallgen pic --help
+echo wallgen bench --help
+wallgen bench --help
\ No newline at end of file
@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+from PIL import Image
+
+from tools.labels import faceColors, labelImage
+from tools.mesh import Mesh
+
+# two triangles splitting a 20x20 square along its diagonal
+SQUARE = Mesh([[0, 0], [20, 0], [20, 20], [0, 20]], [[0, 1, 2], [0, 2, 3]])
+
+
+def test_label_image():
+    labels = labelImage(SQUARE, (30, 20))
+
+    assert labels.shape == (20, 30)
+    assert labels[1, 15] == 0  # above the diagonal
+    assert labels[15, 1] == 1  # below it
+    assert (labels[:, 25:] == -1).all()  # no face there
+
+
+def test_label_image_offset():
+    labels = labelImage(SQUARE, (20, 20), offset=(10, 0))
+    assert labels[15, 0] == 1
+    assert (labels[:, 11:] == -1).all()
+
+
+def brute(img, labels, n, fn):
+    pixels = np.asarray(img).reshape(-1, 3)
+    flat = labels.ravel()
+    return np.array([fn(pixels[flat == i]) for i in range(n)])
+
+
+@pytest.mark.parametrize("mode, fn", [
+    ("mean", lambda p: np.rint(p.mean(axis=0))),
+    ("median", lambda p: np.floor(np.median(p, axis=0) + 0.5)),
+])
+def test_face_colors(mode, fn):
+    img = Image.fromarray(np.random.randint(0, 256, (20, 30, 3),
+                                            dtype=np.uint8))
+    labels = labelImage(SQUARE, img.size)
+    colors, counts = faceColors(img, labels, 3, mode)
+
+    assert counts.tolist() == [(labels == i).sum() for i in range(3)]
+    assert np.array_equal(colors[:2], brute(img, labels, 2, fn))
+    assert colors[2].tolist() == [0, 0, 0]  # no pixels
+
+
+def test_face_colors_dominant():
+    pixels = np.zeros((20, 20, 3), dtype=np.uint8)
+    pixels[...] = (200, 10, 10)
+    pixels[::4, ::4] = (0, 250, 0)  # a sprinkle of another colour
+    img = Image.fromarray(pixels)
+    colors, _ = faceColors(img, labelImage(SQUARE, img.size), 2, "dominant")
+    assert colors.tolist() == [[200, 10, 10], [200, 10, 10]]
+
+
+def test_face_colors_mode():
+    img = Image.new("RGB", (20, 20))
+    with pytest.raises(ValueError):
+        faceColors(img, labelImage(SQUARE, img.size), 2, "mode")
@@ -0,0 +1,34 @@
+import io
+
+import numpy as np
+from PIL import Image
+
+from tools.palette import applyPalette, flatPalette
+
+
+def test_flat_palette_exact():
+    # few colours, the palette holds them exactly
+    colors = np.random.randint(0, 256, (20, 3), dtype=np.uint8)
+    index = np.random.randint(0, 20, (60, 60))
+    img = Image.fromarray(colors[index])
+
+    indexed = applyPalette(img, flatPalette(img))
+    assert indexed.mode == "P"
+    assert np.array_equal(np.asarray(indexed.convert("RGB")),
+                          np.asarray(img))
+
+    out = io.BytesIO()
+    indexed.save(out, format="PNG")
+    out.seek(0)
+    assert np.array_equal(np.asarray(Image.open(out).convert("RGB")),
+                          np.asarray(img))
+
+
+def test_flat_palette_ramps():
+    img = Image.new("RGB", (40, 20), (255, 0, 0))
+    img.paste((0, 0, 255), (20, 0, 40, 20))
+    pal = np.array(flatPalette(img, ramps=3).getpalette()).reshape(-1, 3)
+
+    # both colours and three blends between them
+    assert len({tuple(c) for c in pal[:5]}) == 5
+    assert {(255, 0, 0), (0, 0, 255)} <= {tuple(c) for c in pal[:5]}
@@ -0,0 +1,81 @@
+"""
+timings of every render stage. save a baseline with
+
+    pytest tests/test_perf.py --benchmark-autosave
+
+and later runs fail when a stage got slower than it by more than the given
+share, e.g. --benchmark-compare --benchmark-compare-fail=median:15%
+"""
+
+import io
+
+import pytest
+from PIL import Image
+
+from tools.gradient import (
+    NbyNGradient,
+    nGradient,
+    random_gradient,
+    swirl_image)
+from tools.points import conditionPoints, randomPoints, triangulate
+from tools.shapes import SHAPES, drawSlants, genPoly
+
+pytest.importorskip("pytest_benchmark")
+
+SIDE = 1000
+POINTS = 5000
+
+
+@pytest.fixture
+def gradient():
+    return random_gradient(SIDE)
+
+
+@pytest.fixture
+def points():
+    return conditionPoints(randomPoints(POINTS, SIDE, SIDE))
+
+
+def test_random_gradient(benchmark):
+    benchmark(random_gradient, SIDE)
+
+
+def test_ngradient(benchmark):
+    benchmark(nGradient, SIDE, (255, 0, 0), (0, 221, 255), (20, 20, 20))
+
+
+def test_nbyn_gradient(benchmark):
+    benchmark(NbyNGradient, SIDE)
+
+
+def test_swirl(benchmark, gradient):
+    benchmark(swirl_image, gradient, 5)
+
+
+def test_delaunay(benchmark, points):
+    benchmark(triangulate, points)
+
+
+def test_poly(benchmark, gradient, points):
+    mesh = triangulate(points)
+    benchmark(genPoly, SIDE, SIDE, gradient, mesh, 0, 0, pic=True)
+
+
+@pytest.mark.parametrize("shape", sorted(SHAPES))
+def test_shape(benchmark, gradient, shape):
+    benchmark(SHAPES[shape], SIDE, SIDE, gradient, pic=True, per=2)
+
+
+def test_slants(benchmark):
+    benchmark(drawSlants, SIDE)
+
+
+def test_resize(benchmark, gradient):
+    benchmark(gradient.resize, (SIDE // 2, SIDE // 2),
+              resample=Image.BICUBIC)
+
+
+def test_encode(benchmark, points):
+    img = genPoly(SIDE, SIDE, random_gradient(SIDE), triangulate(points),
+                  0, 0)
+    benchmark(img.save, io.BytesIO(), format="PNG")
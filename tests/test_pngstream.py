@@ -0,0 +1,61 @@
+import io
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from tools.palette import paletteImage
+from tools.pngstream import PNGWriter, writeBands
+
+
+def write(img, band=7, **kwargs):
+    out = io.BytesIO()
+    with PNGWriter(out, img.size, img.mode, **kwargs) as png:
+        for top in range(0, img.height, band):
+            bottom = min(top + band, img.height)
+            png.write(img.crop((0, top, img.width, bottom)))
+    out.seek(0)
+    return Image.open(out)
+
+
+@pytest.mark.parametrize("mode", ["L", "RGB", "RGBA"])
+def test_round_trip(mode):
+    pixels = np.random.randint(0, 256, (50, 37, 4), dtype=np.uint8)
+    img = Image.fromarray(pixels, "RGBA").convert(mode)
+    back = write(img)
+
+    assert back.mode == mode
+    assert np.array_equal(np.asarray(back), np.asarray(img))
+
+
+def test_round_trip_palette():
+    colors = np.random.randint(0, 256, (16, 3), dtype=np.uint8)
+    pal = paletteImage(colors)
+    index = np.random.randint(0, 16, (40, 30), dtype=np.uint8)
+    img = Image.fromarray(index, "P")
+    img.putpalette(pal.getpalette())
+
+    back = write(img, palette=pal)
+    assert back.mode == "P"
+    assert np.array_equal(np.asarray(back), index)
+    assert np.array_equal(np.asarray(back.convert("RGB")),
+                          np.asarray(img.convert("RGB")))
+
+
+def test_write_bands_file(tmp_path):
+    img = Image.fromarray(np.random.randint(0, 256, (64, 20, 3),
+                                            dtype=np.uint8))
+    path = tmp_path / "bands.png"
+    writeBands(path, img.size, (np.asarray(img)[i:i + 10]
+                                for i in range(0, 64, 10)))
+    assert np.array_equal(np.asarray(Image.open(path)), np.asarray(img))
+
+
+def test_missing_rows():
+    with pytest.raises(ValueError):
+        with PNGWriter(io.BytesIO(), (10, 10)) as png:
+            png.write(np.zeros((5, 10, 3), dtype=np.uint8))
+            png.close()
+    with pytest.raises(ValueError):
+        PNGWriter(io.BytesIO(), (10, 10)).write(
+            np.zeros((11, 10, 3), dtype=np.uint8))
@@ -0,0 +1,65 @@
+import numpy as np
+from scipy.spatial import Delaunay
+
+from tools.points import (
+    conditionPoints,
+    partitionedFaces,
+    randomPoints,
+    triangulate,
+    uniqueIndex)
+
+
+def faceSet(faces):
+    return set(map(tuple, np.sort(faces, axis=1).tolist()))
+
+
+def test_unique_index_keeps_first():
+    points = np.array([[3, 4], [1, 2], [3, 4], [0, 0], [1, 2]])
+    assert uniqueIndex(points).tolist() == [0, 1, 3]
+
+
+def test_condition_points_drops_repeats():
+    points = randomPoints(5000, 100, 100)
+    stats = {}
+    kept = conditionPoints(points, stats=stats)
+
+    assert len(np.unique(points, axis=0)) == len(kept)
+    assert stats['removed'] == len(points) - len(kept)
+    assert np.array_equal(kept, points[uniqueIndex(points)])
+
+
+def test_condition_points_jitter():
+    points = np.unique(randomPoints(2000, 500, 500), axis=0)
+    moved = conditionPoints(points, jitter=0.25)
+
+    offset = moved - points
+    assert np.abs(offset).max() <= 0.25
+    assert (offset != 0).any()
+    assert len(np.unique(moved, axis=0)) == len(points)
+
+
+def test_partitioned_faces_match_delaunay():
+    # general position, the triangulation is unique
+    points = np.random.uniform(0, 1000, (20000, 2))
+    faces = partitionedFaces(points, 3)
+
+    assert faces is not None
+    assert faceSet(faces) == faceSet(Delaunay(points).simplices)
+
+
+def test_partitioned_faces_skip_repeats():
+    points = np.random.uniform(0, 1000, (6000, 2))
+    points = np.concatenate((points, points[:500]))
+    faces = partitionedFaces(points, 2)
+
+    assert faces is not None
+    assert faces.max() < 6000
+    assert faceSet(faces) == faceSet(Delaunay(points[:6000]).simplices)
+
+
+def test_triangulate_mesh():
+    points = conditionPoints(randomPoints(1000, 300, 300))
+    mesh = triangulate(points)
+
+    assert np.array_equal(mesh.vertices, points.astype(np.float32))
+    assert faceSet(mesh.faces) == faceSet(Delaunay(points).simplices)
@@ -18,4 +18,16 @@ wallgen poly 1000 -un
 echo wallgen poly 1000 -sw 5
 wallgen poly 1000 -sw 5
 echo wallgen poly 1000 -sc 4
-wallgen poly 1000 -sc 4
\ No newline at end of file
+wallgen poly 1000 -sc 4
+echo wallgen poly 1000 -pr
+wallgen poly 1000 -pr
+echo wallgen poly 1000 -un -bx 8
+wallgen poly 1000 -un -bx 8
+echo wallgen poly 1000 -pl
+wallgen poly 1000 -pl
+echo wallgen poly 1000 -st
+wallgen poly 1000 -st
+echo wallgen poly 1000 -p 60000 -j 2
+wallgen poly 1000 -p 60000 -j 2
+echo wallgen poly 1000 -p 5000 -jt 0.25
+wallgen poly 1000 -p 5000 -jt 0.25
\ No newline at end of file
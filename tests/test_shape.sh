@@ -80,4 +80,10 @@ wallgen shape 1000 -t dia -sc 4
 echo wallgen shape 1000 -t tri -sc 4
 wallgen shape 1000 -t tri -sc 4
 echo wallgen shape 1000 -t iso -sc 4
-wallgen shape 1000 -t iso -sc 4
\ No newline at end of file
+wallgen shape 1000 -t iso -sc 4
+echo wallgen shape 1000 -t hex -pr
+wallgen shape 1000 -t hex -pr
+echo wallgen shape 1500 -t iso -j 2
+wallgen shape 1500 -t iso -j 2
+echo wallgen shape 1000 -t hex -st
+wallgen shape 1000 -t hex -st
\ No newline at end of file
@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+from PIL import Image
+
+from tools.points import randomPoints, triangulate
+from tools.shapes import SHAPES, genPoly
+
+
+def picture(mode, size=(600, 400)):
+    pixels = np.random.randint(0, 256, size[::-1] + (3,), dtype=np.uint8)
+    return Image.fromarray(pixels).convert(mode)
+
+
+@pytest.mark.parametrize("mode", ["L", "LA", "P", "RGBA"])
+@pytest.mark.parametrize("shape", sorted(SHAPES))
+def test_pic_shape_any_mode(shape, mode):
+    img = picture(mode)
+    out = SHAPES[shape](img.width, img.height, img, pic=True, per=5)
+
+    assert out.mode == "RGB"
+    assert out.size == img.size
+    if mode in ("L", "LA"):
+        # gray in, gray out
+        pixels = np.asarray(out)
+        assert (pixels == pixels[..., :1]).all()
+
+
+def test_pic_shape_workers():
+    img = picture("L")
+    one = SHAPES["hex"](img.width, img.height, img.copy(), pic=True, per=5)
+    two = SHAPES["hex"](img.width, img.height, img.copy(), pic=True, per=5,
+                        workers=2)
+    assert np.array_equal(np.asarray(one), np.asarray(two))
+
+
+@pytest.mark.parametrize("mode", ["L", "P"])
+def test_pic_poly_any_mode(mode):
+    img = picture(mode)
+    mesh = triangulate(randomPoints(300, img.width + 12, img.height + 8))
+    out = genPoly(img.width, img.height, img, mesh, 6, 4, pic=True)
+    assert out.size == img.size
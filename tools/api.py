@@ -0,0 +1,272 @@
+"""
+wallgen as a library, also imported as "from wallgen import api". a render
+is described by one of the spec tuples below and comes back as a (height,
+width, 3) uint8 array. pictures go in as arrays or anything numpy can read
+as one, they are never drawn on.
+
+renders can run on several threads at once. the random parts (gradient,
+points, slants) take turns so a seeded render always gives the same image,
+triangulation, resizing, swirling and most numpy work leave the GIL while
+they run and drawing hands it back between polygons
+"""
+
+import random
+import threading
+import numpy as np
+from collections import namedtuple
+from contextlib import contextmanager
+from PIL import Image
+from .canvas import canvases
+from .gradient import NbyNGradient, nGradient, random_gradient, swirl_image
+from .labels import MODES
+from .picture import edgeProxy
+from .points import (
+    MAX_POINTS,
+    conditionPoints,
+    findEdges,
+    randomPoints,
+    sampleEdges,
+    triangulate)
+from .shapes import SHAPES, drawSlants, genPoly
+
+# colors are "#rrggbb" strings or (r, g, b) tuples, an empty colors is a
+# random gradient (nbyn for NbyNGradient). scale is the anti aliasing
+# factor, seed makes the render repeatable, workers is used for
+# triangulating or drawing shapes in parallel processes (0 for every core)
+PolySpec = namedtuple(
+    "PolySpec",
+    "side points colors nbyn boxes swirl outline scale jitter seed workers",
+    defaults=(100, (), False, 5, 0, None, 2, 0, None, 1))
+
+ShapeSpec = namedtuple(
+    "ShapeSpec",
+    "side shape percent colors nbyn boxes swirl outline scale seed workers",
+    defaults=("hex", 1, (), False, 5, 0, None, 2, None, 1))
+
+SlantsSpec = namedtuple("SlantsSpec", "side swirl seed",
+                        defaults=(0, None))
+
+# the picture is passed to the render function along with these. points
+# is 1000 when not given, smart renders then follow the edges of the picture
+PicPolySpec = namedtuple(
+    "PicPolySpec", "points smart outline sample jitter seed workers",
+    defaults=(None, False, None, "centre", 0, None, 1))
+
+PicShapeSpec = namedtuple("PicShapeSpec", "shape percent outline workers",
+                          defaults=("hex", 1, None, 1))
+
+# random and numpy.random are shared by every thread
+rng_lock = threading.Lock()
+
+
+@contextmanager
+def seeded(seed=None):
+    """ hold the random generators, seeded if seed is given """
+    with rng_lock:
+        if seed is not None:
+            random.seed(seed)
+            np.random.seed(seed % 2**32)
+        yield
+
+
+def asColor(color):
+    """ (r, g, b) of a "#rrggbb" string or a sequence of three numbers """
+    if isinstance(color, str):
+        try:
+            rgb = tuple(bytes.fromhex(color.lstrip("#")))
+        except ValueError:
+            rgb = ()
+    else:
+        rgb = tuple(int(c) for c in color)
+    if len(rgb) != 3 or not all(0 <= c <= 255 for c in rgb):
+        raise ValueError("Invalid color {!r}".format(color))
+    return rgb
+
+
+def asPicture(picture):
+    """
+    RGB image of a (height, width), (height, width, 3) or (height, width, 4)
+    uint8 array, or of anything numpy reads as one. alpha is dropped
+    """
+    if isinstance(picture, Image.Image):
+        return picture.convert("RGB")
+
+    pixels = np.asarray(picture)
+    if pixels.dtype != np.uint8:
+        raise ValueError("Pictures must be uint8, not {}".format(pixels.dtype))
+    if pixels.ndim == 2:
+        return Image.fromarray(pixels, "L").convert("RGB")
+    if pixels.ndim != 3 or pixels.shape[2] not in (3, 4):
+        raise ValueError("Pictures must be (height, width[, 3 or 4]) arrays")
+    return Image.fromarray(np.ascontiguousarray(pixels[..., :3]), "RGB")
+
+
+def asArray(img, scale=1):
+    """ img shrunk by scale as a new array, canvases go back to the pool """
+    if scale > 1:
+        small = img.resize((img.width // scale, img.height // scale),
+                           resample=Image.BICUBIC)
+        canvases.give(img)
+        img = small
+    pixels = np.array(img)
+    canvases.give(img)
+    return pixels
+
+
+def gradient(side, colors, nbyn, boxes):
+    if colors:
+        if len(colors) < 2:
+            raise ValueError("One color gradient not possible")
+        return nGradient(side, *[asColor(c) for c in colors])
+    if nbyn:
+        return NbyNGradient(side, boxes)
+    return random_gradient(side)
+
+
+def swirled(img, strength):
+    if not strength:
+        return img
+    out = swirl_image(img, strength)
+    canvases.give(img)
+    return out
+
+
+def check(spec):
+    if spec.side < 50:
+        raise ValueError("Image too small. Minimum size 50")
+    if spec.scale < 1:
+        raise ValueError("Invalid scale value")
+    if spec.boxes < 1:
+        raise ValueError("Invalid number of boxes")
+    if spec.workers < 0:
+        raise ValueError("Invalid number of workers")
+
+
+def drawShapes(shape, width, height, img, outline, pic, per, workers):
+    try:
+        return SHAPES[shape](width, height, img, outline, pic=pic, per=per,
+                             workers=workers)
+    except ZeroDivisionError:
+        raise ValueError("{}x{} is too small for {} at {} percent".format(
+            width, height, shape, per))
+
+
+def renderPoly(spec):
+    """ low poly image over a gradient, as wallgen poly makes it """
+    check(spec)
+    if not 3 <= spec.points <= MAX_POINTS:
+        raise ValueError("Points must be between 3 and {}".format(MAX_POINTS))
+    outline = spec.outline and asColor(spec.outline)
+
+    side = spec.side * spec.scale
+    shift = side // 10
+    nside = side + shift * 2
+    points = max(spec.points, 1000) if spec.nbyn and not spec.colors \
+        else spec.points
+
+    with seeded(spec.seed):
+        img = gradient(nside, spec.colors, spec.nbyn, spec.boxes)
+        pts = conditionPoints(randomPoints(points, nside, nside),
+                              spec.jitter)
+
+    img = swirled(img, spec.swirl)
+    mesh = triangulate(pts, spec.workers)
+    poly = genPoly(side, side, img, mesh, shift, shift, outl=outline)
+    canvases.give(img)
+
+    return asArray(poly, spec.scale)
+
+
+def renderShape(spec):
+    """ image of one of the shapes over a gradient, as wallgen shape """
+    check(spec)
+    if spec.shape not in SHAPES:
+        raise ValueError("Shape must be one of " + ", ".join(SHAPES))
+    if not 1 <= spec.percent <= 10:
+        raise ValueError("Percent range 1-10")
+    outline = spec.outline and asColor(spec.outline)
+
+    side = spec.side * spec.scale
+    with seeded(spec.seed):
+        img = gradient(side, spec.colors, spec.nbyn, spec.boxes)
+
+    img = swirled(img, spec.swirl)
+    img = drawShapes(spec.shape, side, side, img, outline, False,
+                     spec.percent, spec.workers)
+
+    return asArray(img, spec.scale)
+
+
+def renderSlants(spec):
+    """ slanting stripes, as wallgen slants """
+    if spec.side < 1:
+        raise ValueError("Invalid size")
+    with seeded(spec.seed):
+        img = drawSlants(spec.side)
+
+    return asArray(swirled(img, spec.swirl))
+
+
+def renderPicPoly(picture, spec):
+    """ low poly version of a picture, as wallgen pic poly """
+    if spec.points is not None and not 3 <= spec.points <= MAX_POINTS:
+        raise ValueError("Points must be between 3 and {}".format(MAX_POINTS))
+    if spec.sample not in MODES:
+        raise ValueError("Sample must be one of " + ", ".join(MODES))
+    outline = spec.outline and asColor(spec.outline)
+
+    img = asPicture(picture)
+    width, height = img.size
+    wshift, hshift = width // 100, height // 100
+
+    if spec.smart:
+        edges = findEdges(edgeProxy(img), weighted=spec.points is not None)
+        with seeded(spec.seed):
+            pts = sampleEdges(edges, (width, height), spec.points,
+                              spec.jitter)
+        del edges
+    else:
+        with seeded(spec.seed):
+            pts = conditionPoints(randomPoints(spec.points or 1000,
+                                               width + 2 * wshift,
+                                               height + 2 * hshift),
+                                  spec.jitter)
+    pts = triangulate(pts, spec.workers)
+
+    return asArray(genPoly(width, height, img, pts, wshift, hshift, outline,
+                           pic=True, mode=spec.sample))
+
+
+def renderPicShape(picture, spec):
+    """ a picture made of one of the shapes, as wallgen pic shape """
+    if spec.shape not in SHAPES:
+        raise ValueError("Shape must be one of " + ", ".join(SHAPES))
+    if not 1 <= spec.percent <= 10:
+        raise ValueError("Percent range 1-10")
+    outline = spec.outline and asColor(spec.outline)
+
+    img = asPicture(picture)  # always a new image, safe to draw on
+    width, height = img.size
+    return asArray(drawShapes(spec.shape, width, height, img, outline, True,
+                              spec.percent, spec.workers))
+
+
+RENDERS = {
+    PolySpec: renderPoly,
+    ShapeSpec: renderShape,
+    SlantsSpec: renderSlants,
+    PicPolySpec: renderPicPoly,
+    PicShapeSpec: renderPicShape,
+}
+
+
+def render(spec, picture=None):
+    """ render any spec, picture is needed by the Pic specs """
+    fn = RENDERS.get(type(spec))
+    if fn is None:
+        raise TypeError("Not a render spec: {!r}".format(spec))
+    if isinstance(spec, (PicPolySpec, PicShapeSpec)):
+        if picture is None:
+            raise ValueError("{} needs a picture".format(type(spec).__name__))
+        return fn(picture, spec)
+    return fn(spec)
@@ -0,0 +1,120 @@
+import os
+import random
+import threading
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from .canvas import canvases, nbytes
+from .gradient import NbyNGradient, random_gradient
+
+DEPTH = 2  # backgrounds kept ready for every key
+KEYS = 4  # most recently asked for (kind, side) that are kept ready
+HITS = 2  # times a key is asked for before it is kept ready
+SEEN = 64  # keys whose asks are counted
+LIMIT = 256 * 2**20  # bytes of ready backgrounds at most
+
+
+def makeBackground(kind, side, rng=random):
+    """ a random ("random" or "nbyn") gradient """
+    if kind == "nbyn":
+        return NbyNGradient(side, rng=rng)
+    return random_gradient(side, rng=rng)
+
+
+class BackgroundPool:
+    """
+    rings of ready made random backgrounds for the sizes asked for lately,
+    once they were asked for HITS times so a one off size costs nothing.
+    a thread refills them while no render is running, so taking one only
+    costs a pop. a refill that started can not be stopped, so only the
+    gradients are made ahead and never swirled (seconds at large sizes).
+    started lazily, so it can be made before forking
+    """
+
+    def __init__(self, depth=DEPTH, keys=KEYS, limit=LIMIT, hits=HITS):
+        self.depth = depth
+        self.keys = keys
+        self.limit = limit
+        self.hits = hits
+        self.asked = OrderedDict()
+        self.ready = OrderedDict()
+        self.held = 0
+        self.active = 0
+        self.pid = None
+        self.cond = threading.Condition()
+
+    def take(self, key):
+        """ a ready background for key (kind, side), or None """
+        with self.cond:
+            self.start()
+            self.asked[key] = self.asked.pop(key, 0) + 1
+            while len(self.asked) > SEEN:
+                self.asked.popitem(last=False)
+            if key not in self.ready and self.asked[key] < self.hits:
+                return None
+
+            ring = self.ready.setdefault(key, deque())
+            self.ready.move_to_end(key)
+            while len(self.ready) > self.keys:
+                _, old = self.ready.popitem(last=False)
+                self.held -= sum(nbytes(img) for img in old)
+
+            img = ring.popleft() if ring else None
+            if img is not None:
+                self.held -= nbytes(img)
+            self.cond.notify()
+            return img
+
+    @contextmanager
+    def busy(self):
+        """ no refill starts while a render holds this """
+        with self.cond:
+            self.start()
+            self.active += 1
+        try:
+            yield
+        finally:
+            with self.cond:
+                self.active -= 1
+                self.cond.notify()
+
+    def start(self):
+        if self.pid == os.getpid():
+            return
+        # threads do not survive a fork, every process needs its own
+        self.pid = os.getpid()
+        self.ready.clear()
+        self.asked.clear()
+        self.held = 0
+        self.active = 0
+        threading.Thread(target=self.refill, daemon=True).start()
+
+    def wanted(self):
+        """ the key most short of backgrounds that still fits, or None """
+        short = [(len(ring), key) for key, ring in self.ready.items()
+                 if len(ring) < self.depth and
+                 self.held + key[1] ** 2 * 4 <= self.limit]
+        return min(short)[1] if short else None
+
+    def refill(self):
+        # a generator of its own, a refill that is already running must not
+        # draw from the one a seeded render has just seeded
+        rng = random.Random()
+        while True:
+            with self.cond:
+                while self.active or self.wanted() is None:
+                    self.cond.wait()
+                key = self.wanted()
+
+            img = makeBackground(*key, rng=rng)
+
+            with self.cond:
+                ring = self.ready.get(key)
+                if ring is None or len(ring) >= self.depth:
+                    canvases.give(img)
+                    continue
+                ring.append(img)
+                self.held += nbytes(img)
+
+
+# ready backgrounds of this process
+backgrounds = BackgroundPool()
@@ -0,0 +1,203 @@
+import io
+import sys
+import random
+import platform
+import statistics
+import numpy as np
+from .profiler import Profile
+from .picture import edgeProxy
+from .points import (
+    conditionPoints,
+    genSmartPoints,
+    randomPoints,
+    triangulate)
+from .gradient import Image, NbyNGradient, random_gradient, swirl_image
+from .shapes import (
+    SHAPES,
+    drawSlants,
+    genPoly,
+    genTriangle,
+    polyCenters,
+    sampleColors)
+
+SIDES = (500, 1000, 2000)
+POINTS = (100, 1000, 10000)
+REPEAT = 3
+SEED = 42
+SCALE = 2  # same anti aliasing scale as the cli default
+
+COMMANDS = ('poly', 'shape', 'slants', 'pic-poly', 'pic-smart', 'pic-shape')
+
+
+def encode(img, prof):
+    with prof.stage('encode'):
+        img.save(io.BytesIO(), format="PNG")
+
+
+def benchPoly(side, points, prof, swirl=True):
+    side = side * SCALE
+    shift = side // 10
+    nside = side + shift * 2
+
+    with prof.stage('gradient'):
+        img = random_gradient(nside)
+    if swirl:
+        with prof.stage('swirl'):
+            img = swirl_image(img, 5)
+    with prof.stage('points'):
+        pts = randomPoints(points, nside, nside)
+    with prof.stage('condition'):
+        pts = conditionPoints(pts)
+    with prof.stage('delaunay'):
+        pts = triangulate(pts)
+    with prof.stage('sample'):
+        colors = sampleColors(img, polyCenters(pts, side, side, shift, shift))
+    with prof.stage('raster'):
+        img = genPoly(side, side, img, pts, shift, shift, colors=colors)
+    with prof.stage('resize'):
+        img = img.resize((side // SCALE, side // SCALE),
+                         resample=Image.BICUBIC)
+    encode(img, prof)
+
+
+def benchShape(side, shape, prof):
+    side = side * SCALE
+
+    with prof.stage('gradient'):
+        img = NbyNGradient(side)
+    with prof.stage('raster'):
+        img = SHAPES[shape](side, side, img, per=5)
+    with prof.stage('resize'):
+        img = img.resize((side // SCALE, side // SCALE),
+                         resample=Image.BICUBIC)
+    encode(img, prof)
+
+
+def benchSlants(side, prof):
+    with prof.stage('raster'):
+        img = drawSlants(side)
+    with prof.stage('swirl'):
+        img = swirl_image(img, 5)
+    encode(img, prof)
+
+
+def makePicture(side):
+    """ seeded stand in for a photo, a gradient with plenty of edges """
+    img = NbyNGradient(side)
+    return genTriangle(side, side, img, per=3)
+
+
+def benchPicPoly(picture, points, prof, smart=False):
+    width, height = picture.size
+    wshift = width // 100
+    hshift = height // 100
+
+    if smart:
+        stats = {}
+        with prof.stage('edges'):
+            gray = edgeProxy(picture)
+        pts = genSmartPoints(gray, size=(width, height), stats=stats)
+        prof.add('edges', stats['edges'])
+        prof.add('points', stats['sample'])
+        prof.add('delaunay', stats['delaunay'])
+    else:
+        n_width = width + 2 * wshift
+        n_height = height + 2 * hshift
+        with prof.stage('points'):
+            pts = randomPoints(points, n_width, n_height)
+        with prof.stage('condition'):
+            pts = conditionPoints(pts)
+        with prof.stage('delaunay'):
+            pts = triangulate(pts)
+
+    with prof.stage('raster'):
+        img = genPoly(width, height, picture, pts, wshift, hshift, pic=True)
+    encode(img, prof)
+
+
+def benchPicShape(picture, shape, prof):
+    width, height = picture.size
+
+    with prof.stage('raster'):
+        img = SHAPES[shape](width, height, picture.copy(), pic=True, per=5)
+    encode(img, prof)
+
+
+def cases(commands, sides, points):
+    """ every (command, side, variant) combination to measure """
+    for command in commands:
+        for side in sides:
+            if command in ('poly', 'pic-poly'):
+                for n in points:
+                    yield command, side, n
+            elif command in ('shape', 'pic-shape'):
+                for shape in SHAPES:
+                    yield command, side, shape
+            else:
+                yield command, side, None
+
+
+def runCase(command, side, variant):
+    prof = Profile()
+
+    if command == 'poly':
+        benchPoly(side, variant, prof)
+    elif command == 'shape':
+        benchShape(side, variant, prof)
+    elif command == 'slants':
+        benchSlants(side, prof)
+    else:
+        picture = makePicture(side)
+        if command == 'pic-poly':
+            benchPicPoly(picture, variant, prof)
+        elif command == 'pic-smart':
+            benchPicPoly(picture, None, prof, smart=True)
+        else:
+            benchPicShape(picture, variant, prof)
+
+    return prof.durations()
+
+
+def summary(runs):
+    """ min/median/max of every stage over repeated runs """
+    stages = {}
+    for name in runs[0]:
+        values = [r[name] for r in runs]
+        stages[name] = dict(min=min(values),
+                            median=statistics.median(values),
+                            max=max(values))
+    return stages
+
+
+def bench(commands=COMMANDS, sides=SIDES, points=POINTS, repeat=REPEAT,
+          seed=SEED, progress=None):
+    """ time every stage of every command, returns a json-able dict """
+
+    results = []
+    for command, side, variant in cases(commands, sides, points):
+        runs = []
+        for _ in range(repeat):
+            random.seed(seed)
+            np.random.seed(seed)
+            times = runCase(command, side, variant)
+            times['total'] = sum(times.values())
+            runs.append(times)
+
+        result = dict(command=command, side=side, stages=summary(runs))
+        if command in ('poly', 'pic-poly'):
+            result['points'] = variant
+        elif command in ('shape', 'pic-shape'):
+            result['shape'] = variant
+        results.append(result)
+
+        if progress:
+            progress(result)
+
+    return dict(
+        python=sys.version.split()[0],
+        platform=platform.platform(),
+        numpy=np.__version__,
+        seed=seed,
+        repeat=repeat,
+        scale=SCALE,
+        results=results)
@@ -0,0 +1,85 @@
+import threading
+import numpy as np
+from PIL import Image
+
+KEEP = 2  # idle buffers kept for every size
+LIMIT = 512 * 2**20  # bytes kept idle at most, over every size
+
+
+class CanvasPool:
+    """
+    idle images and arrays keyed by their size, so that repeated renders
+    reuse the same big buffers instead of allocating new ones every time.
+    only give back what nothing else holds on to
+    """
+
+    def __init__(self, keep=KEEP, limit=LIMIT):
+        self.keep = keep
+        self.limit = limit
+        self.free = {}
+        self.held = 0
+        self.lock = threading.Lock()
+
+    def take(self, key):
+        with self.lock:
+            idle = self.free.get(key)
+            if not idle:
+                return None
+            obj = idle.pop()
+            self.held -= nbytes(obj)
+            return obj
+
+    def image(self, mode, size, color=None):
+        """ an image of this mode and size, filled with color if given """
+        img = self.take(("image", mode, tuple(size)))
+        if img is None:
+            return Image.new(mode, size, 0 if color is None else color)
+        if color is not None:
+            img.paste(color, (0, 0) + img.size)
+        return img
+
+    def array(self, shape, dtype=np.uint8):
+        """ an array of this shape and dtype, with garbage in it """
+        arr = self.take(("array", tuple(shape), np.dtype(dtype).str))
+        if arr is None:
+            return np.empty(shape, dtype=dtype)
+        return arr
+
+    def give(self, *objs):
+        """ return images or arrays to the pool """
+        for obj in objs:
+            if obj is None:
+                continue
+            if isinstance(obj, np.ndarray):
+                if obj.base is not None or not obj.flags.writeable:
+                    continue  # a view, it does not own its memory
+                key = ("array", obj.shape, obj.dtype.str)
+            else:
+                key = ("image", obj.mode, obj.size)
+
+            size = nbytes(obj)
+            with self.lock:
+                idle = self.free.setdefault(key, [])
+                if len(idle) >= self.keep or \
+                        self.held + size > self.limit or \
+                        any(o is obj for o in idle):
+                    continue
+                idle.append(obj)
+                self.held += size
+
+    def clear(self):
+        with self.lock:
+            self.free = {}
+            self.held = 0
+
+
+def nbytes(obj):
+    if isinstance(obj, np.ndarray):
+        return obj.nbytes
+    bands = len(obj.getbands())
+    # PIL keeps 3 channel images as 4 bytes per pixel
+    return obj.width * obj.height * (4 if bands == 3 else bands)
+
+
+# shared by the render stages of a process
+canvases = CanvasPool()
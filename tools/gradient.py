@@ -1,15 +1,30 @@
-import warnings
+import random
 import numpy as np
-from random import randint
-from skimage import img_as_ubyte
-from skimage.transform import swirl
+from scipy import ndimage
 from PIL import Image, ImageDraw, ImageFilter
+from .canvas import canvases
 
+SWIRL_BAND = 256  # rows swirled at a time, bounds the float temporaries
+NBYN_BOXES = 5
+NBYN_BASE = 40  # pixels per box NbyN gradients are made at
 
-def random_gradient(side):
-    img = Image.new("RGB", (side, side), "#FFFFFF")
+
+def canvas(side, color, rows=None):
+    """ an image filled with color from the canvas pool """
+    return canvases.image("RGB", (side, rows or side), color)
+
+
+def random_gradient(side, rows=None, rng=random):
+    """
+    gradient from left to right. every row is the same, so rows=1 makes
+    a strip that can stand for the whole square. colours come from rng,
+    the shared generator unless given
+    """
+    # every column is drawn over, no need to clear a reused canvas
+    img = canvases.image("RGB", (side, rows or side))
     draw = ImageDraw.Draw(img)
 
+    randint = rng.randint
     r, g, b = randint(0, 255), randint(0, 255), randint(0, 255)
     dr = (randint(0, 255) - r) / side
     dg = (randint(0, 255) - g) / side
@@ -21,8 +36,9 @@ def random_gradient(side):
     return img
 
 
-def nGradient(side, *colors):
-    img = Image.new("RGB", (side, side), "#FFFFFF")
+def nGradient(side, *colors, rows=None):
+    """ gradient through colors from left to right, rows as above """
+    img = canvas(side, "#FFFFFF", rows)
     draw = ImageDraw.Draw(img)
 
     nc = len(colors)
@@ -41,51 +57,75 @@ def nGradient(side, *colors):
     return img
 
 
-def NbyNGradient(side):
-    base_color = "#00ffff"
-    img = Image.new("RGB", (side, side), base_color)
-    draw = ImageDraw.Draw(img)
+def NbyNGradient(side, n_boxes=NBYN_BOXES, rng=random):
+    """
+    n_boxes x n_boxes boxes of column gradients, blurred together. made
+    at NBYN_BASE pixels per box and scaled up, the blur leaves nothing
+    finer than that to lose, so the cost barely depends on side. colours
+    come from rng as above
+    """
 
-    n_boxes = 5
     boxes_size = side // n_boxes
+    base = max(min(boxes_size, NBYN_BASE), 1)
+    scale = boxes_size / base if boxes_size else 1
+    small = -(-side * base // max(boxes_size, 1))  # ceil(side / scale)
+
+    pixels = np.empty((small, small, 3), dtype=np.float32)
+    pixels[:] = (0, 255, 255)  # "#00ffff" shows in the leftover strips
 
-    xmin, xmax = 0, boxes_size
-    ymin, ymax = 0, boxes_size
+    # position of every base column within its box, in full size columns
+    cols = (np.arange(base) + 0.5) * scale - 0.5
+    randint = rng.randint
 
     for i in range(n_boxes):
         for j in range(n_boxes):
-            r, g, b = [randint(0, 255), randint(0, 255), randint(0, 255)]
-
-            dr = (randint(0, 255) - r) / boxes_size
-            dg = (randint(0, 255) - g) / boxes_size
-            db = (randint(0, 255) - b) / boxes_size
-
-            for k in range(xmin, xmax):
-                draw.line([k, ymin, k, ymax], fill=(int(r), int(g), int(b)))
-                r += dr
-                g += dg
-                b += db
-
-            xmin += boxes_size
-            xmax += boxes_size
-
-        xmin = 0
-        xmax = boxes_size
-        ymin += boxes_size
-        ymax += boxes_size
-
-    img = img.filter(ImageFilter.GaussianBlur(radius=boxes_size // n_boxes))
+            start = np.array([randint(0, 255), randint(0, 255),
+                              randint(0, 255)], dtype=np.float32)
+            end = np.array([randint(0, 255), randint(0, 255),
+                            randint(0, 255)], dtype=np.float32)
+            delta = (end - start) / max(boxes_size, 1)
+
+            pixels[i * base:(i + 1) * base, j * base:(j + 1) * base] = \
+                start + cols[:, None] * delta
+
+    img = Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8))
+    img = img.filter(
+        ImageFilter.GaussianBlur(radius=(boxes_size // n_boxes) / scale))
+    if img.size != (side, side):
+        img = img.resize((side, side), resample=Image.BILINEAR,
+                         box=(0, 0, side / scale, side / scale))
     return img
 
 
 def swirl_image(image, strength=10):
-    image = np.array(image)
-    w, h = image.shape[:2]
-    sw = swirl(image, rotation=0, strength=strength, radius=max(w, h))
-    with warnings.catch_warnings():
-        warnings.simplefilter('ignore')
-        sw = img_as_ubyte(sw)
-
-    pil_img = Image.fromarray(sw)
-
-    return pil_img
+    """
+    swirl image about its centre, same mapping as skimage's swirl. works a
+    band of rows at a time into a pooled canvas, so no full size float
+    copy of the image is ever made
+    """
+
+    width, height = image.size
+    planes = [np.asarray(band) for band in image.convert("RGB").split()]
+
+    x0, y0 = width / 2, height / 2
+    # decays to about 1/1000th within the radius
+    radius = max(width, height) / 5 * np.log(2)
+
+    out = canvases.image("RGB", (width, height))
+    xs = np.arange(width) - x0
+    for top in range(0, height, SWIRL_BAND):
+        ys = np.arange(top, min(top + SWIRL_BAND, height))[:, None] - y0
+        rho = np.hypot(xs, ys)
+        theta = strength * np.exp(-rho / radius) + np.arctan2(ys, xs)
+        coords = np.stack((y0 + rho * np.sin(theta),
+                           x0 + rho * np.cos(theta)))
+
+        band = np.empty(rho.shape + (3,), dtype=np.uint8)
+        for i, plane in enumerate(planes):
+            values = ndimage.map_coordinates(plane, coords, order=1,
+                                             mode="mirror",
+                                             output=np.float32)
+            band[..., i] = np.rint(values)
+        out.paste(Image.fromarray(band), (0, top))
+
+    return out
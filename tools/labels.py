@@ -0,0 +1,91 @@
+import numpy as np
+from PIL import Image, ImageDraw
+from .mesh import DRAW_CHUNK
+
+MODES = ("centre", "mean", "median", "dominant")
+DOMINANT_BITS = 4  # bits kept of every channel to find the dominant colour
+
+
+def labelImage(mesh, size, offset=(0, 0)):
+    """
+    int32 array of the face of mesh, moved by -offset, covering every pixel
+    of a size canvas, -1 where there is none. faces are drawn in order like
+    drawMesh does, so every pixel belongs to the face that shows there
+    """
+
+    labels = Image.new("I", size, -1)
+    draw = ImageDraw.Draw(labels)
+    vertices = mesh.vertices
+    if offset != (0, 0):
+        vertices = vertices - np.asarray(offset, dtype=np.float32)
+
+    for i in range(0, len(mesh), DRAW_CHUNK):
+        xys = vertices[mesh.faces[i:i + DRAW_CHUNK]]
+        for j, xy in enumerate(xys.reshape(len(xys), -1).tolist(), i):
+            draw.polygon(xy, fill=j)
+
+    return np.asarray(labels)
+
+
+def faceColors(img, labels, n, mode="mean"):
+    """
+    colour of each of the n faces from the pixels of img labelled with it,
+    their mean, per channel median or dominant colour. returns the (n, 3)
+    colours and the number of pixels of every face, faces without pixels
+    are black
+    """
+
+    rgb = img if img.mode == "RGB" else img.convert("RGB")
+    flat = labels.ravel()
+    keep = flat >= 0
+    lab = flat[keep]
+    pixels = np.asarray(rgb).reshape(-1, 3)[keep]
+    del keep
+
+    counts = np.bincount(lab, minlength=n)
+    colors = np.zeros((n, 3), dtype=np.uint8)
+    has = counts > 0
+
+    if mode == "mean":
+        for c in range(3):
+            sums = np.bincount(lab, weights=pixels[:, c], minlength=n)
+            colors[has, c] = np.rint(sums[has] / counts[has])
+
+    elif mode == "median":
+        # sorting label * 256 + value puts every face's values in order,
+        # one after the other, so the medians are found by position
+        dtype = np.uint32 if n < 2**24 else np.uint64
+        key = lab.astype(dtype) << 8
+        starts = np.cumsum(counts) - counts
+        lo = (starts + (counts - 1) // 2)[has]
+        hi = (starts + counts // 2)[has]
+        for c in range(3):
+            values = np.sort(key | pixels[:, c]) & 255
+            colors[has, c] = (values[lo].astype(np.uint16) +
+                              values[hi] + 1) // 2
+
+    elif mode == "dominant":
+        # most common colour, at DOMINANT_BITS per channel, and the mean of
+        # the pixels falling in it
+        bits = DOMINANT_BITS
+        q = (pixels >> (8 - bits)).astype(np.int64)
+        key = (lab.astype(np.int64) << (3 * bits)) | \
+            (q[:, 0] << (2 * bits)) | (q[:, 1] << bits) | q[:, 2]
+        del q
+        bins, inverse, sizes = np.unique(key, return_inverse=True,
+                                         return_counts=True)
+        del key
+        faces = bins >> (3 * bits)
+        # the last bin of every face, ordered by size, is the largest
+        order = np.lexsort((sizes, faces))
+        last = np.flatnonzero(np.diff(faces[order], append=-1))
+        best = order[last]
+        for c in range(3):
+            sums = np.bincount(inverse.ravel(), weights=pixels[:, c],
+                               minlength=len(bins))
+            colors[faces[best], c] = np.rint(sums[best] / sizes[best])
+
+    else:
+        raise ValueError("Unknown colour mode {}".format(mode))
+
+    return colors, counts
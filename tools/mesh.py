@@ -0,0 +1,151 @@
+import os
+import numpy as np
+from PIL import Image, ImageDraw
+from multiprocessing import shared_memory
+from concurrent.futures import ProcessPoolExecutor
+from .transport import BufferPool
+
+DRAW_CHUNK = 4096  # faces converted to python lists at a time when drawing
+BAND_MIN_PIXELS = 4000000  # smaller images are not worth splitting
+
+band_buffers = BufferPool(keep=1)
+
+
+class Mesh:
+    """
+    polygons sharing one float32 (n, 2) vertex array, described by an int32
+    (faces, corners) index array, with an optional uint8 rgb colour per face.
+    numpy arrays only, so it stays small and is cheap to pickle
+    """
+
+    def __init__(self, vertices, faces, colors=None):
+        self.vertices = np.ascontiguousarray(vertices, dtype=np.float32)
+        self.faces = np.ascontiguousarray(faces, dtype=np.int32)
+        self.colors = None
+        if colors is not None:
+            self.colors = np.ascontiguousarray(colors, dtype=np.uint8)
+
+    @classmethod
+    def fromCorners(cls, corners, colors=None):
+        """ mesh from a (faces, corners, 2) array, vertices are not shared """
+        corners = np.asarray(corners)
+        n, k = corners.shape[:2]
+        return cls(corners.reshape(-1, 2), np.arange(n * k).reshape(n, k),
+                   colors)
+
+    def __len__(self):
+        return len(self.faces)
+
+    def __reduce__(self):
+        return (Mesh, (self.vertices, self.faces, self.colors))
+
+    @property
+    def corners(self):
+        """ (faces, corners, 2) coordinates, a new float64 array """
+        return self.vertices.astype(float)[self.faces]
+
+    def withColors(self, colors):
+        """ same geometry, other colours. the arrays are shared """
+        mesh = Mesh.__new__(Mesh)
+        mesh.vertices = self.vertices
+        mesh.faces = self.faces
+        mesh.colors = np.ascontiguousarray(colors, dtype=np.uint8)
+        return mesh
+
+
+def asMesh(points):
+    """ accept a Mesh or a (faces, corners, 2) array of coordinates """
+    if isinstance(points, Mesh):
+        return points
+    return Mesh.fromCorners(points)
+
+
+def drawMesh(img, mesh, outl=None, offset=(0, 0), index=None):
+    """
+    draw the faces of mesh in their colours onto img, moved by -offset.
+    index restricts drawing to those faces, in that order
+    """
+
+    draw = ImageDraw.Draw(img)
+    faces = mesh.faces if index is None else mesh.faces[index]
+    colors = mesh.colors if index is None else mesh.colors[index]
+    vertices = mesh.vertices
+    if offset != (0, 0):
+        vertices = vertices - np.asarray(offset, dtype=np.float32)
+
+    for i in range(0, len(faces), DRAW_CHUNK):
+        xys = vertices[faces[i:i + DRAW_CHUNK]]
+        xys = xys.reshape(len(xys), -1).tolist()
+        cs = colors[i:i + DRAW_CHUNK].tolist()
+
+        for xy, c in zip(xys, cs):
+            if outl:
+                draw.polygon(xy, fill=tuple(c), outline=outl)
+            else:
+                draw.polygon(xy, fill=tuple(c))
+
+    return img
+
+
+def clipFaces(mesh, box, offset=(0, 0)):
+    """
+    indices of the faces of mesh, moved by -offset, that reach into
+    box (left, top, right, bottom)
+    """
+    xy = mesh.vertices[mesh.faces] - np.asarray(offset, dtype=np.float32)
+    lo, hi = xy.min(axis=1), xy.max(axis=1)
+    left, top, right, bottom = box
+    # one pixel of slack for outlines and rounding
+    return np.flatnonzero((hi[:, 0] >= left - 1) & (lo[:, 0] <= right + 1) &
+                          (hi[:, 1] >= top - 1) & (lo[:, 1] <= bottom + 1))
+
+
+def drawBand(name, shape, y0, y1, mesh, outl):
+    """ draw mesh into rows y0 to y1 of an image kept in shared memory """
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        pixels = np.ndarray(shape, dtype=np.uint8, buffer=shm.buf)
+        band = Image.fromarray(pixels[y0:y1])
+        drawMesh(band, mesh, outl, offset=(0, y0))
+        pixels[y0:y1] = np.asarray(band)
+        del pixels
+    finally:
+        shm.close()
+
+
+def drawMeshBands(img, mesh, outl=None, workers=0):
+    """
+    drawMesh, with the image split into horizontal bands drawn by a pool
+    of processes. every band draws all the faces reaching into it, in the
+    same order, so the bands join without seams. workers=0 uses every core
+    """
+
+    workers = workers or os.cpu_count() or 1
+    if workers < 2 or img.mode != "RGB" or \
+            img.width * img.height < BAND_MIN_PIXELS:
+        return drawMesh(img, mesh, outl)
+
+    shape = (img.height, img.width, 3)
+    shm = band_buffers.take(int(np.prod(shape)))
+    try:
+        pixels = np.ndarray(shape, dtype=np.uint8, buffer=shm.buf)
+        pixels[:] = np.asarray(img)
+
+        bounds = np.linspace(0, img.height, workers * 2 + 1).astype(int)
+        with ProcessPoolExecutor(workers) as pool:
+            jobs = []
+            for y0, y1 in zip(bounds[:-1], bounds[1:]):
+                index = clipFaces(mesh, (0, y0, img.width, y1))
+                band = Mesh(mesh.vertices, mesh.faces[index],
+                            mesh.colors[index])
+                jobs.append(pool.submit(drawBand, shm.name, shape,
+                                        int(y0), int(y1), band, outl))
+            for job in jobs:
+                job.result()
+
+        img.paste(Image.fromarray(pixels))
+        del pixels
+    finally:
+        band_buffers.give(shm)
+
+    return img
@@ -0,0 +1,123 @@
+import threading
+
+# seconds, fit for renders that take from a few ms to a minute
+TIME_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10,
+                30, 60)
+# bytes, 10KB to 5MB uploads
+SIZE_BUCKETS = (10e3, 50e3, 100e3, 250e3, 500e3, 1e6, 2.5e6, 5e6)
+
+
+def formatLabels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join('{}="{}"'.format(k, str(v).replace('"', '\\"'))
+                          for k, v in labels) + "}"
+
+
+def formatValue(v):
+    if v == float("inf"):
+        return "+Inf"
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name, doc, lock):
+        self.name = name
+        self.doc = doc
+        self.lock = lock
+        self.values = {}
+
+    def key(self, labels):
+        return tuple(sorted(labels.items()))
+
+    def lines(self):
+        for labels, value in sorted(self.values.items()):
+            yield "{}{} {}".format(self.name, formatLabels(labels),
+                                   formatValue(value))
+
+    def expose(self):
+        head = ["# HELP {} {}".format(self.name, self.doc),
+                "# TYPE {} {}".format(self.name, self.kind)]
+        return "\n".join(head + list(self.lines()))
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self.key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def inc(self, amount=1, **labels):
+        key = self.key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value, **labels):
+        with self.lock:
+            self.values[self.key(labels)] = value
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, doc, lock, buckets=TIME_BUCKETS):
+        super().__init__(name, doc, lock)
+        self.buckets = tuple(buckets) + (float("inf"),)
+
+    def observe(self, value, **labels):
+        key = self.key(labels)
+        with self.lock:
+            counts, total = self.values.get(
+                key, ([0] * len(self.buckets), 0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self.values[key] = (counts, total + value)
+
+    def lines(self):
+        for labels, (counts, total) in sorted(self.values.items()):
+            for bound, count in zip(self.buckets, counts):
+                yield "{}_bucket{} {}".format(
+                    self.name,
+                    formatLabels(labels + (("le", formatValue(bound)),)),
+                    count)
+            yield "{}_sum{} {}".format(self.name, formatLabels(labels),
+                                       formatValue(float(total)))
+            yield "{}_count{} {}".format(self.name, formatLabels(labels),
+                                         counts[-1])
+
+
+class Registry:
+    """ a set of metrics rendered in the prometheus text format """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.metrics = []
+
+    def add(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, doc):
+        return self.add(Counter(name, doc, self.lock))
+
+    def gauge(self, name, doc):
+        return self.add(Gauge(name, doc, self.lock))
+
+    def histogram(self, name, doc, buckets=TIME_BUCKETS):
+        return self.add(Histogram(name, doc, self.lock, buckets))
+
+    def expose(self):
+        with self.lock:
+            return "\n".join(m.expose() for m in self.metrics) + "\n"
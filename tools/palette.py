@@ -0,0 +1,77 @@
+import numpy as np
+from PIL import Image
+
+PALETTE_SIZE = 256  # most colours an indexed PNG can hold
+SAMPLE_PIXELS = 1000000  # colours are gathered from a sample this big
+
+
+def paletteImage(colors):
+    """ "P" image holding a (n, 3) array of colours as its palette """
+    pal = Image.new("P", (1, 1))
+    pal.putpalette(np.asarray(colors, dtype=np.uint8).ravel().tolist())
+    return pal
+
+
+def touchingPairs(indexed):
+    """ pairs of palette indices side by side in indexed, most common first """
+    idx = np.asarray(indexed).astype(np.uint16)
+    counts = np.zeros(PALETTE_SIZE * PALETTE_SIZE, dtype=np.int64)
+
+    for a, b in ((idx[:, :-1], idx[:, 1:]), (idx[:-1], idx[1:])):
+        edge = a != b
+        lo = np.minimum(a[edge], b[edge])
+        hi = np.maximum(a[edge], b[edge])
+        counts += np.bincount(lo * PALETTE_SIZE + hi,
+                              minlength=counts.size)
+
+    order = np.argsort(counts)[::-1]
+    order = order[counts[order] > 0]
+    return np.stack((order // PALETTE_SIZE, order % PALETTE_SIZE), axis=1)
+
+
+def flatPalette(img, ramps=0, size=PALETTE_SIZE):
+    """
+    palette for a flat shaded image, the exact colours of its polygons when
+    they fit and a median cut of them otherwise. with ramps, the blends
+    between the most common pairs of touching colours are added too, so
+    that anti aliased edges keep a few steps
+    """
+
+    rgb = img if img.mode == "RGB" else img.convert("RGB")
+    budget = size // 2 if ramps else size
+
+    # nearest neighbour keeps the colours exact, only the tiniest shapes
+    # can be missed and they get their nearest colour
+    k = (rgb.width * rgb.height / SAMPLE_PIXELS) ** 0.5
+    if k > 1:
+        rgb = rgb.resize((max(int(rgb.width / k), 1),
+                          max(int(rgb.height / k), 1)), Image.NEAREST)
+
+    colors = rgb.getcolors(budget)
+    if colors is not None:
+        colors = np.array([c for _, c in colors], dtype=np.uint8)
+    else:
+        cut = rgb.quantize(budget, method=Image.Quantize.MEDIANCUT)
+        colors = np.array(cut.getpalette()[:budget * 3],
+                          dtype=np.uint8).reshape(-1, 3)
+
+    if not ramps or len(colors) < 2:
+        return paletteImage(colors)
+
+    indexed = rgb.quantize(palette=paletteImage(colors),
+                           dither=Image.Dither.NONE)
+    pairs = touchingPairs(indexed)[:(size - len(colors)) // ramps]
+
+    a = colors[pairs[:, 0]].astype(np.float32)
+    b = colors[pairs[:, 1]].astype(np.float32)
+    steps = np.arange(1, ramps + 1, dtype=np.float32) / (ramps + 1)
+    blends = a[:, None] + (b - a)[:, None] * steps[None, :, None]
+
+    return paletteImage(np.concatenate(
+        (colors, np.rint(blends).reshape(-1, 3).astype(np.uint8))))
+
+
+def applyPalette(img, palette):
+    """ img as an indexed image, every pixel to its nearest palette colour """
+    rgb = img if img.mode == "RGB" else img.convert("RGB")
+    return rgb.quantize(palette=palette, dither=Image.Dither.NONE)
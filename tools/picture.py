@@ -0,0 +1,88 @@
+import numpy as np
+from PIL import Image
+
+WORK_SIDE = 1500  # longest side of the proxy used for edge detection
+
+
+class PictureTooLarge(ValueError):
+    pass
+
+
+def fitSize(size, max_side=0, short_side=0):
+    """
+    size scaled down until its longest side is at most max_side and its
+    shortest at most short_side, 0 means no limit
+    """
+
+    width, height = size
+    s = 1
+    if max_side:
+        s = min(s, max_side / max(width, height))
+    if short_side:
+        s = min(s, short_side / min(width, height))
+
+    return max(round(width * s), 1), max(round(height * s), 1)
+
+
+def draftPicture(img, max_side=0, short_side=0, max_decode=0):
+    """
+    size img is to be shrunk to, bounded as fitSize does. JPEGs are set up
+    to be decoded directly at a reduced scale, nothing is decoded here.
+    pictures that still need more than max_decode pixels decoded raise
+    PictureTooLarge
+    """
+
+    size = fitSize(img.size, max_side, short_side)
+
+    if size != img.size:
+        # only does something for JPEGs, decodes at 1/2, 1/4 or 1/8 scale
+        img.draft("RGB", size)
+
+    if max_decode and img.width * img.height > max_decode:
+        raise PictureTooLarge("Picture too large, {}x{} pixels".format(
+            *img.size))
+
+    return size
+
+
+def pictureSize(path, max_side=0, short_side=0, max_decode=0):
+    """ size openPicture gives the picture at path, reads only its header """
+    with Image.open(path) as img:
+        return draftPicture(img, max_side, short_side, max_decode)
+
+
+def openPicture(path, max_side=0, short_side=0, max_decode=0):
+    """
+    open a picture bounded as draftPicture does, so the full resolution
+    image of a JPEG never has to be held in memory. the size of the picture
+    before any of that is kept in img.info["full_size"]
+    """
+
+    img = Image.open(path)
+    full = img.size
+    try:
+        size = draftPicture(img, max_side, short_side, max_decode)
+    except PictureTooLarge:
+        img.close()
+        raise
+
+    if size != img.size:
+        img.thumbnail(size, Image.BICUBIC)
+
+    img.info["full_size"] = full
+    return img
+
+
+def edgeProxy(img, work_side=WORK_SIDE):
+    """ grayscale working copy of img, at most work_side pixels long """
+
+    factor = -(-max(img.size) // work_side)  # ceil
+
+    if img.mode not in ("RGB", "RGBA", "L"):
+        img = img.convert("RGB")
+    if factor > 1:
+        img = img.reduce(factor)
+
+    gray = np.asarray(img.convert("L"), dtype=np.float32)
+    gray *= 1 / 255
+    return gray
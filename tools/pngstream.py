@@ -0,0 +1,106 @@
+import zlib
+import struct
+import numpy as np
+from PIL import Image
+
+SIGNATURE = b"\x89PNG\r\n\x1a\n"
+IDAT_SIZE = 1 << 18  # compressed bytes gathered before an IDAT is written
+
+# colour type and channels of the modes that can be written
+COLOR_TYPES = {"L": (0, 1), "RGB": (2, 3), "P": (3, 1), "RGBA": (6, 4)}
+
+
+class PNGWriter:
+    """
+    write a PNG a band of rows at a time, compressing every band as it
+    comes. only the current band and the zlib window are held, so the
+    memory used depends on the band height and not on the image height
+    """
+
+    def __init__(self, fp, size, mode="RGB", palette=None, level=6):
+        if mode not in COLOR_TYPES:
+            raise ValueError("Can not stream {} images".format(mode))
+        if mode == "P" and palette is None:
+            raise ValueError("Palette images need a palette")
+
+        self.fp = fp
+        self.width, self.height = size
+        self.mode = mode
+        self.channels = COLOR_TYPES[mode][1]
+        self.rows = 0
+        self.last = None
+        self.pending = []
+        self.zip = zlib.compressobj(level)
+
+        fp.write(SIGNATURE)
+        self.chunk(b"IHDR", struct.pack(">IIBBBBB", self.width, self.height,
+                                        8, COLOR_TYPES[mode][0], 0, 0, 0))
+        if mode == "P":
+            colors = palette.getpalette() if isinstance(palette, Image.Image) \
+                else list(palette)
+            self.chunk(b"PLTE", bytes(colors[:256 * 3]))
+
+    def chunk(self, kind, data):
+        self.fp.write(struct.pack(">I", len(data)))
+        self.fp.write(kind)
+        self.fp.write(data)
+        self.fp.write(struct.pack(">I", zlib.crc32(data, zlib.crc32(kind))))
+
+    def write(self, band):
+        """ append the rows of band, an image or array of the full width """
+        if isinstance(band, Image.Image):
+            if band.mode != self.mode:
+                band = band.convert(self.mode)
+            band = np.asarray(band)
+        rows = np.ascontiguousarray(band, dtype=np.uint8).reshape(
+            len(band), self.width * self.channels)
+        if self.rows + len(rows) > self.height:
+            raise ValueError("More rows than the image height")
+
+        # "up" filter, each row minus the one above. flat shaded images are
+        # mostly zeros after it. palette indices are not worth filtering
+        out = np.empty((len(rows), rows.shape[1] + 1), dtype=np.uint8)
+        if self.mode == "P":
+            out[:, 0] = 0
+            out[:, 1:] = rows
+        else:
+            out[:, 0] = 2
+            np.subtract(rows[1:], rows[:-1], out=out[1:, 1:])
+            if self.last is None:
+                out[0, 1:] = rows[0]
+            else:
+                np.subtract(rows[0], self.last, out=out[0, 1:])
+            self.last = rows[-1].copy()
+
+        self.rows += len(rows)
+        self.flush(self.zip.compress(out))
+
+    def flush(self, data, final=False):
+        if data:
+            self.pending.append(data)
+        size = sum(map(len, self.pending))
+        if size >= IDAT_SIZE or (final and size):
+            self.chunk(b"IDAT", b"".join(self.pending))
+            self.pending = []
+
+    def close(self):
+        if self.rows != self.height:
+            raise ValueError("Got {} of {} rows".format(self.rows,
+                                                        self.height))
+        self.flush(self.zip.flush(), final=True)
+        self.chunk(b"IEND", b"")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, kind, value, tb):
+        if kind is None:
+            self.close()
+
+
+def writeBands(path, size, bands, mode="RGB", palette=None):
+    """ write the bands of rows, an iterable, as the PNG at path """
+    with open(path, "wb") as fp:
+        with PNGWriter(fp, size, mode, palette) as png:
+            for band in bands:
+                png.write(band)
@@ -1,10 +1,28 @@
-import warnings
+import os
+import time
 import numpy as np
-from PIL import Image
 from random import randint
+from collections import namedtuple
 from skimage.filters import sobel
-from scipy.spatial import Delaunay
-from skimage import color, img_as_ubyte
+from scipy.spatial import ConvexHull, Delaunay, cKDTree
+from concurrent.futures import ProcessPoolExecutor
+from .mesh import Mesh
+
+# edge pixels of a proxy picture, shape is the (height, width) of the proxy
+Edges = namedtuple("Edges", "xs ys weights shape nbytes")
+
+UNIFORM_SHARE = 0.1  # part of a smart point budget spread evenly
+
+# most points poly and pic poly take, more need a lot of memory
+MAX_POINTS = int(os.environ.get("WALLGEN_MAX_POINTS", 200000))
+
+BORDER_STEPS = 50  # points along every side of the smart points border
+PARTITION_MIN_POINTS = 50000  # fewer points are triangulated in one go
+STRIP_OVERLAP = 0.1  # share of its points a strip borrows from each side
+
+# rough cost model used to turn a time budget into a number of points
+POINT_COST = 3e-5  # seconds per point, triangulation and drawing
+PIXEL_COST = 5e-8  # seconds per output pixel
 
 
 def distance(p1, p2):
@@ -35,79 +53,341 @@ def populate(a, b, n, width, height, ret):
     ret.extend(points)
 
 
-def genPoints(qty, width, height):
+def randomPoints(qty, width, height):
     side = max(width, height)
-    randPoints = np.random.choice(side, size=(qty, 2))
-    tri = Delaunay(randPoints)  # calculate D triangulation of points
-    points = tri.points[tri.simplices]  # find all groups of points
-
+    return np.random.choice(side, size=(qty, 2))
+
+
+def uniqueIndex(points):
+    """ index of the first of every distinct point, in order """
+    points = np.asarray(points)
+    if not len(points):
+        return np.arange(0)
+
+    if np.issubdtype(points.dtype, np.integer):
+        # whole numbers pack into a single int64 key, cheap to sort
+        lo = points.min(axis=0).astype(np.int64)
+        rows = points.max(axis=0).astype(np.int64)[1] - lo[1] + 1
+        keys = (points[:, 0] - lo[0]) * rows + (points[:, 1] - lo[1])
+    else:
+        pairs = np.ascontiguousarray(points, dtype=float)
+        keys = pairs.view(np.complex128).ravel()
+
+    _, first = np.unique(keys, return_index=True)
+    first.sort()
+    return first
+
+
+def conditionPoints(points, jitter=0, stats=None):
+    """
+    drop repeated points, qhull only skips them after sorting them out.
+    jitter moves every point by up to that many pixels at random, which
+    breaks up the collinear and cocircular runs of whole number points.
+    the number of points dropped is stored in stats['removed'] if given
+    """
+    keep = uniqueIndex(points)
+    if stats is not None:
+        stats['removed'] = len(points) - len(keep)
+
+    points = np.asarray(points)[keep]
+    if jitter:
+        points = points + np.random.uniform(-jitter, jitter, points.shape)
     return points
 
 
-def calcCenter(ps):
-    """ calculate incenter of a triangle given all vertices"""
-    mid1 = ((ps[0][0] + ps[1][0]) / 2, (ps[0][1] + ps[1][1]) / 2)
-    mid = ((mid1[0] + ps[2][0]) / 2, (mid1[1] + ps[2][1]) / 2)
-    return mid
+def borderPoints(width, height, steps=BORDER_STEPS):
+    """ about steps points along every side of the image, corners once """
+    ws = max(width // steps, 1)
+    hs = max(height // steps, 1)
+
+    bx = np.arange(0, width + ws, ws)
+    by = np.arange(0, height + hs, hs)
+    by = by[(by != 0) & (by != height)]  # the corners are in the rows
+    return np.concatenate((
+        np.column_stack((bx, np.zeros_like(bx))),
+        np.column_stack((bx, np.full_like(bx, height))),
+        np.column_stack((np.zeros_like(by), by)),
+        np.column_stack((np.full_like(by, width), by))))
+
+
+def circumcircles(points, faces):
+    """ centres and squared radii of the circles through every face """
+    a, b, c = (points[faces[:, i]] for i in range(3))
+    b, c = b - a, c - a
+    d = 2 * (b[:, 0] * c[:, 1] - b[:, 1] * c[:, 0])
+    bb, cc = (b ** 2).sum(axis=1), (c ** 2).sum(axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ux = (c[:, 1] * bb - b[:, 1] * cc) / d
+        uy = (b[:, 0] * cc - c[:, 0] * bb) / d
+    return a + np.column_stack((ux, uy)), ux ** 2 + uy ** 2
+
+
+def triangulateStrip(points, index, core, slab):
+    """
+    triangulate the points of a slab, given with their global index, and
+    keep the triangles whose circle is centred in the core x range. returns
+    them in global indices, and whether their circle stays inside the slab,
+    which makes them delaunay triangles of the whole set too
+    """
+
+    faces = Delaunay(points).simplices
+    centres, r2 = circumcircles(points, faces)
+    cx, r = centres[:, 0], np.sqrt(r2)
+
+    owned = (cx >= core[0]) & (cx < core[1])
+    faces, cx, r = faces[owned], cx[owned], r[owned]
+    # the slab has every point whose x is between its ends, so none of
+    # them being inside the circle is enough
+    safe = (cx - r > slab[0]) & (cx + r < slab[1])
+    return index[faces], safe
+
+
+def partitionedFaces(points, workers):
+    """
+    delaunay triangles of points, made in overlapping vertical strips by a
+    pool of processes. every triangle belongs to the strip its circle is
+    centred in. triangles whose circle leaves the strip are checked against
+    all the points, and None is returned when they do not make a complete
+    triangulation
+    """
+
+    # repeated points are left out of a delaunay triangulation anyway, here
+    # they would only be patched in as zero area triangles
+    keep = uniqueIndex(points)
+    points = points[keep]
+
+    n = len(points)
+    order = np.argsort(points[:, 0], kind="stable")
+    xs = points[order, 0]
+    bounds = np.linspace(0, n, workers + 1).astype(int)
+    extra = int(n / workers * STRIP_OVERLAP)
+
+    jobs = []
+    with ProcessPoolExecutor(workers) as pool:
+        for i, (start, end) in enumerate(zip(bounds[:-1], bounds[1:])):
+            lo, hi = max(start - extra, 0), min(end + extra, n)
+            core = (-np.inf if i == 0 else xs[start],
+                    np.inf if end == n else xs[end])
+            slab = (-np.inf if lo == 0 else xs[lo],
+                    np.inf if hi == n else xs[hi - 1])
+            index = order[lo:hi]
+            jobs.append(pool.submit(triangulateStrip, points[index], index,
+                                    core, slab))
+        strips = [job.result() for job in jobs]
+
+    faces = np.concatenate([f for f, _ in strips])
+    safe = np.concatenate([s for _, s in strips])
+    faces = np.concatenate((faces[safe], delaunayFaces(points, faces[~safe])))
+
+    # thin triangles along the hull have huge circles, those missing near
+    # the seams are made again from the points around the holes they leave
+    patch = holePoints(points, faces)
+    if len(patch) >= 3:
+        extra = delaunayFaces(points, patch[Delaunay(points[patch]).simplices])
+        # leave out the ones already there, only faces made of patch points
+        # can be
+        inside = np.zeros(n, dtype=bool)
+        inside[patch] = True
+        near = np.flatnonzero(inside[faces].all(axis=1))
+        both = np.sort(np.concatenate((faces[near], extra)), axis=1)
+        _, first = np.unique(both, axis=0, return_index=True)
+        faces = np.concatenate((faces, extra[first[first >= len(near)] -
+                                             len(near)]))
+
+    # the triangles do not overlap, they only cover the hull when none is
+    # missing
+    a, b, c = (points[faces[:, i]] for i in range(3))
+    b, c = b - a, c - a
+    area = np.abs(b[:, 0] * c[:, 1] - b[:, 1] * c[:, 0]).sum() / 2
+    hull = ConvexHull(points).volume
+    if abs(area - hull) > hull * 1e-9:
+        return None
+    return keep[faces]
+
+
+def delaunayFaces(points, faces):
+    """ the faces whose circle has none of points inside it """
+    if not len(faces):
+        return faces
+
+    centres, r2 = circumcircles(points, faces)
+    finite = np.isfinite(r2)
+    faces, centres, r2 = faces[finite], centres[finite], r2[finite]
+    # the corners are on the circle, any point inside it is closer to the
+    # centre than them and comes first
+    dist, near = cKDTree(points).query(centres, k=4)
+    inside = (dist < np.sqrt(r2)[:, None] * (1 - 1e-9)) & \
+        (near[:, :, None] != faces[:, None, :]).all(axis=2)
+    return faces[~inside.any(axis=1)]
+
+
+def holePoints(points, faces):
+    """
+    indices of the points on the edges that only one of faces has, the
+    hull and the rim of any hole, and of the points no face uses
+    """
+    n = len(points)
+    edges = np.sort(np.concatenate((faces[:, :2], faces[:, 1:],
+                                    faces[:, ::2])), axis=1)
+    keys, counts = np.unique(edges[:, 0].astype(np.int64) * n + edges[:, 1],
+                             return_counts=True)
+    once = keys[counts == 1]
+    unused = np.flatnonzero(np.bincount(faces.ravel(), minlength=n) == 0)
+    return np.unique(np.concatenate((once // n, once % n, unused)))
+
+
+def triangulate(points, workers=1):
+    """
+    delaunay triangulation of points. large point sets are split into
+    strips over workers processes, workers=0 uses every core
+    """
+
+    workers = workers or os.cpu_count() or 1
+    if workers > 1 and len(points) >= PARTITION_MIN_POINTS:
+        points = np.asarray(points, dtype=float)
+        faces = partitionedFaces(points, workers)
+        if faces is not None:
+            return Mesh(points, faces)
 
+    tri = Delaunay(points)  # calculate D triangulation of points
+    return Mesh(tri.points, tri.simplices)  # all groups of points
 
-def genSmartPoints(image):
-    width = image.shape[1]
-    height = image.shape[0]
-
-    edges = sobel(image)
-
-    # convert to RGB compatible image
-    with warnings.catch_warnings():
-        warnings.simplefilter('ignore')
-        rgb_img = img_as_ubyte(color.gray2rgb(edges))
 
-    # convert to PIL image
-    pimg = Image.fromarray(rgb_img)
-    idata = pimg.load()
+def genPoints(qty, width, height, workers=1):
+    return triangulate(conditionPoints(randomPoints(qty, width, height)),
+                       workers)
 
-    edges_data = []
 
-    # get image pixel data and pass through a filter to get only prominent
-    # edges
+def calcCenter(ps):
+    """
+    colour sampling point of a triangle, halfway between the midpoint of
+    the first two vertices and the third. not its centroid nor incenter,
+    it leans towards the third vertex. kept as it is so renders do not
+    change, pic poly --sample looks at every pixel instead
+    """
+    mid1 = ((ps[0][0] + ps[1][0]) / 2, (ps[0][1] + ps[1][1]) / 2)
+    mid = ((mid1[0] + ps[2][0]) / 2, (mid1[1] + ps[2][1]) / 2)
+    return mid
 
-    for x in range(pimg.width):
-        for y in range(pimg.height):
-            if sum(idata[x, y]) / 3 > 10:
-                edges_data.append((x, y))
 
-    # print(len(edges_data))
+def budgetPoints(seconds, width, height):
+    """ number of points that can be rendered in roughly this much time """
+    seconds -= width * height * PIXEL_COST  # edges, copies and encoding
+    return max(3, int(seconds / POINT_COST))
 
-    # sometimes edges detected wont pass ^ this required case
-    if len(edges_data) < 1:
-        raise Exception("EdgeDetectionError")
 
-    # get a n/5 number of points rather than all of the points
-    sample = np.random.choice(len(edges_data), len(
-        edges_data) // 5 if len(edges_data) / 5 < 50000 else 50000)
-    edges_data = [edges_data[x] for x in sample]
+def gridPoints(qty, width, height):
+    """ about qty points spread evenly over the image, with some jitter """
+    cols = max(1, round((qty * width / height) ** 0.5))
+    rows = max(1, qty // cols)
+    cw, ch = width / cols, height / rows
 
-    # print(len(edges_data))
+    gx, gy = np.meshgrid(np.arange(cols), np.arange(rows))
+    points = np.column_stack((gx.ravel(), gy.ravel())).astype(float)
+    points += np.random.uniform(0.2, 0.8, points.shape)
 
-    points = []
-    radius = int(0.1 * (width + height) / 2)  # noqa: F841
+    return points * (cw, ch)
 
-    # print(radius)
 
-    points = edges_data
+def findEdges(image, weighted=False):
+    """
+    the prominent edge pixels of a grayscale image, with their sobel
+    strength as weights if asked for. raises when there are none
+    """
+    # float32 is enough for the gradient, and keeps the one copy sobel makes
+    # at half the size
+    if image.dtype != np.float32:
+        image = image.astype(np.float32) / (255 if image.dtype == np.uint8
+                                            else 1)
+    edges = sobel(image)
 
-    ws = width // 50
-    hs = height // 50
+    # pass through a filter to get only prominent edges, same cut off as
+    # an 8 bit edge value above 10
+    mask = edges > 10.5 / 255
+    array_bytes = image.nbytes + edges.nbytes + mask.nbytes
+    weights = edges[mask] if weighted else None
+    del edges
 
-    for x in range(0, width + ws, ws):
-        points.append((x, 0))
-        points.append((x, height))
+    ys, xs = np.nonzero(mask)
+    del mask
 
-    for y in range(0, height + hs, hs):
-        points.append((0, y))
-        points.append((width, y))
+    # sometimes edges detected wont pass ^ this required case
+    if len(xs) < 1:
+        raise Exception("EdgeDetectionError")
 
-    tri = Delaunay(points)  # calculate D triangulation of points
-    delaunay_points = tri.points[tri.simplices]  # find all groups of points
+    return Edges(xs, ys, weights, image.shape, array_bytes)
+
+
+def sampleEdges(edges, size=None, qty=None, jitter=0, stats=None):
+    """
+    the random part of smart points, points placed on the edges found by
+    findEdges (weighted if qty is given) and a border, conditioned and
+    ready to be triangulated. size and qty are as genSmartPoints takes
+    """
+    height, width = edges.shape
+    scale = 1 if size is None else size[0] / width
+    xs, ys = edges.xs, edges.ys
+
+    if qty is None:
+        # get a n/5 number of points rather than all of the points,
+        # counting edge pixels at the full resolution
+        n = int(len(xs) * scale * scale) // 5
+        sample = np.random.choice(len(xs), n if n < 50000 else 50000)
+        floor = np.empty((0, 2))
+    else:
+        n_floor = int(qty * UNIFORM_SHARE)
+        n = min(qty - n_floor, len(xs))
+
+        # weighted sampling without replacement, keep the n largest keys
+        keys = np.log(np.random.random(len(xs))) / edges.weights
+        sample = np.argpartition(keys, -n)[-n:] if n else []
+
+        floor = gridPoints(n_floor, width, height) * scale \
+            if n_floor else np.empty((0, 2))
+
+    edges_data = np.column_stack((xs[sample], ys[sample])) * scale
+
+    if scale > 1:
+        # spread the points over the full resolution pixels of each proxy one
+        edges_data += np.random.uniform(0, scale, edges_data.shape)
+
+    edges_data = np.concatenate((edges_data, floor))
+
+    if size is not None:
+        width, height = size
+
+    points = np.concatenate((edges_data, borderPoints(width, height)))
+    return conditionPoints(points, jitter, stats)
+
+
+def genSmartPoints(image, size=None, stats=None, qty=None, workers=1):
+    """
+    triangulate points placed on the edges of a grayscale image.
+    image may be a reduced proxy of the picture, size is then the
+    (width, height) of the full picture the points are scaled to.
+    qty bounds the number of points, they are then drawn by edge strength
+    with a share of them spread evenly so flat areas are not left empty.
+    if a dict is passed as stats, timings and array sizes are stored in it.
+    workers is passed on to triangulate
+    """
+    t = time.perf_counter()
+    edges = findEdges(image, weighted=qty is not None)
+    t_edges = time.perf_counter()
+
+    removed = {}
+    points = sampleEdges(edges, size, qty, stats=removed)
+    array_bytes = edges.nbytes
+    del edges
+    t_sample = time.perf_counter()
+
+    delaunay_points = triangulate(points, workers)
+
+    if stats is not None:
+        stats['edges'] = t_edges - t
+        stats['sample'] = t_sample - t_edges
+        stats['delaunay'] = time.perf_counter() - t_sample
+        stats['points'] = len(points)
+        stats['removed'] = removed['removed']
+        stats['array_bytes'] = array_bytes
 
     return delaunay_points
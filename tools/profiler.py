@@ -0,0 +1,115 @@
+import sys
+import json
+import time
+import cProfile
+import resource
+from contextlib import contextmanager
+
+
+def resetPeak():
+    """ restart the peak memory counter of the process, linux only """
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def peakMemory():
+    """ peak resident memory of the process in bytes """
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class Profile:
+    """
+    wall time, cpu time and peak memory of the named stages of a render.
+    memory is only measured when enabled, timings are always kept. counts
+    hold anything else worth reporting, like points dropped
+    """
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.stages = []
+        self.counts = {}
+
+    @contextmanager
+    def stage(self, name):
+        if self.enabled:
+            resetPeak()
+        wall, cpu = time.perf_counter(), time.process_time()
+
+        try:
+            yield
+        finally:
+            record = dict(name=name,
+                          wall=time.perf_counter() - wall,
+                          cpu=time.process_time() - cpu)
+            if self.enabled:
+                record['peak'] = peakMemory()
+            self.stages.append(record)
+
+    def add(self, name, wall, cpu=None):
+        """ record a stage timed elsewhere """
+        self.stages.append(dict(name=name, wall=wall,
+                                cpu=wall if cpu is None else cpu))
+
+    def count(self, name, value):
+        self.counts[name] = self.counts.get(name, 0) + value
+
+    def durations(self):
+        """ wall time of each stage, summed over repeated stages """
+        total = {}
+        for s in self.stages:
+            total[s['name']] = total.get(s['name'], 0) + s['wall']
+        return total
+
+    def total(self):
+        return sum(s['wall'] for s in self.stages)
+
+    def table(self):
+        lines = ["{:<14}{:>10}{:>10}{:>12}".format(
+            "stage", "wall ms", "cpu ms", "peak MB")]
+        for s in self.stages:
+            peak = "{:.1f}".format(s['peak'] / 2**20) if 'peak' in s else "-"
+            lines.append("{:<14}{:>10.1f}{:>10.1f}{:>12}".format(
+                s['name'], s['wall'] * 1000, s['cpu'] * 1000, peak))
+        lines.append("{:<14}{:>10.1f}".format("total", self.total() * 1000))
+        for name, value in self.counts.items():
+            lines.append("{:<14}{:>10}".format(name, value))
+        return "\n".join(lines)
+
+    def line(self):
+        """ one line summary, for logs """
+        return " ".join(["{}={:.0f}ms".format(k, v * 1000)
+                         for k, v in self.durations().items()] +
+                        ["{}={}".format(k, v) for k, v in self.counts.items()])
+
+    def json(self):
+        return json.dumps(dict(stages=self.stages, total=self.total(),
+                               counts=self.counts), indent=2)
+
+
+@contextmanager
+def cprofiled(path=None):
+    """ run the block under cProfile and dump the stats to path """
+    if not path:
+        yield
+        return
+
+    prof = cProfile.Profile()
+    prof.enable()
+    try:
+        yield
+    finally:
+        prof.disable()
+        prof.dump_stats(path)
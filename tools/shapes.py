@@ -1,16 +1,32 @@
 import math
+import numpy as np
 from random import randint
-from .points import calcCenter
-from PIL import Image, ImageDraw
+from .canvas import canvases
+from .labels import faceColors, labelImage
+from .mesh import Mesh, asMesh, clipFaces, drawMesh, drawMeshBands
+from PIL import Image
 
 Image.MAX_IMAGE_PIXELS = 200000000
 
+SLANT_SUBSTEPS = 8  # samples per pixel along x + y to anti alias slants
+BAND_ROWS = 256  # output rows rendered at a time by renderBands
+
+
+def drawSlants(side, aa=True):
+    """
+    stripes of random width and colour running along the diagonals. every
+    pixel on a diagonal x + y has the same colour, so the colours of the
+    diagonals are worked out once and every row is a slice of them
+    """
 
-def drawSlants(side):
     def randcolor(): return (randint(0, 255), randint(0, 255), randint(0, 255))
 
-    img = Image.new("RGB", (side, side), "#FFFFFF")
-    draw = ImageDraw.Draw(img)
+    n = 2 * side  # x + y of a pixel goes from 0 to 2 * side - 2
+    f = SLANT_SUBSTEPS
+    # colour along x + y, sampled f times per pixel, white like the canvas
+    pos = (np.arange((n + 2) * f) + 0.5) / f
+    fine = np.full((len(pos), 3), 255, dtype=np.uint8)
+
     y = 0
     min_w = int(side * 0.01)
     max_w = int(side * 0.1)
@@ -18,368 +34,436 @@ def drawSlants(side):
     while y <= side + adj:
         w = randint(min_w, max_w)
         c = randcolor()
-        draw.line([-adj, y, y, -adj], width=w, fill=c)
-        draw.line([y, side + adj, side + adj, y], width=w, fill=c)
+        # a line of width w across the diagonal covers w * sqrt(2) of x + y
+        half = w / math.sqrt(2)
+        for center in (y - adj, y + side + adj):
+            lo, hi = np.searchsorted(pos, (center - half, center + half))
+            fine[lo:hi] = c
         y += w
 
-    return img
+    if aa:
+        # a pixel covers x + y to x + y + 2, more of it near the middle
+        weights = 1 - np.abs((np.arange(2 * f) + 0.5) / f - 1)
+        weights /= weights.sum()
+        diag = np.stack([np.convolve(fine[:, i], weights, mode="valid")
+                         for i in range(3)], axis=1)[::f][:n]
+        diag = np.round(diag).astype(np.uint8)
+    else:
+        diag = fine[f::f][:n]  # middle of every pixel
+
+    # row y is made of the diagonals y to y + side - 1
+    rows = np.lib.stride_tricks.sliding_window_view(diag, side, axis=0)
+    pixels = np.ascontiguousarray(rows[:side].transpose(0, 2, 1))
+
+    return Image.fromarray(pixels, "RGB")
 
 
 #################
 # TRIANGULATION #
 #################
 
-def genPoly(width, height, img, points, wshift, hshift, outl=None, pic=False):
+def polyCenters(points, width, height, wshift, hshift):
+    """ clamped colour sampling position of every triangle """
+    pts = asMesh(points).corners
+    centers = (pts[:, 0] + pts[:, 1]) / 4 + pts[:, 2] / 2  # see calcCenter
 
-    baseImg = Image.new(
-        "RGB", (width + (wshift * 2), height + (hshift * 2)), "#000000")
+    # keep them on the visible part of the padded canvas
+    np.clip(centers[:, 0], wshift, wshift + width - 1, out=centers[:, 0])
+    np.clip(centers[:, 1], hshift, hshift + height - 1, out=centers[:, 1])
+
+    return centers.astype(np.int32)
+
+
+def clampCenters(centers, width, height, margin):
+    """ move sampling positions that fall off the image to its border """
+    a, b = centers[:, 0], centers[:, 1]
+    a[a >= width] = width - margin
+    a[a <= 0] = margin
+    b[b >= height] = height - margin
+    b[b <= 0] = margin
 
-    baseImg.paste(img, box=(wshift, hshift))
-    bw = baseImg.width
-    bh = baseImg.height
+    return centers.astype(np.int32)
 
-    if pic:
-        idata = baseImg.load()  # load pixel data
-    else:
-        idata = img.load()  # load pixel data
-
-    draw = ImageDraw.Draw(baseImg)
-
-    for p in points:
-        tp = tuple(map(tuple, p))  # convert each pair of points to tuples
-        a, b = calcCenter(tp)
-        try:
-            b = bh - hshift - 5 if b >= bh - hshift else b
-            b = hshift + 5 if b <= hshift else b
-
-            a = bw - wshift - 5 if a >= bw - wshift else a
-            a = wshift + 5 if a <= wshift else a
-
-            c = idata[a, b]
-        except Exception:
-            # print(a,b)
-            c = "#00ff00"  # i dont remember why i did this lmao
-
-        if outl:
-            draw.polygon(tp, fill=c, outline=outl)
+
+def sampleColors(img, centers):
+    """
+    gather the colour under every centre in a single lookup. PIL images
+    are read pixel by pixel instead, to avoid copying a large picture
+    """
+    if isinstance(img, Image.Image):
+        w, h = img.size
+        xs = np.clip(centers[:, 0], 0, w - 1).tolist()
+        ys = np.clip(centers[:, 1], 0, h - 1).tolist()
+        rgb = img if img.mode == "RGB" else img.convert("RGB")
+        idata = rgb.load()
+        return np.array([idata[x, y] for x, y in zip(xs, ys)],
+                        dtype=np.uint8).reshape(-1, 3)
+
+    h, w = img.shape[:2]
+    xs = np.clip(centers[:, 0], 0, w - 1)
+    ys = np.clip(centers[:, 1], 0, h - 1)
+
+    return img[ys, xs]
+
+
+def sampleFaces(img, mesh, centers, offset=(0, 0), mode="centre"):
+    """
+    colour of every face of mesh, moved by -offset, from img. "centre"
+    takes the pixel under its centre, "mean", "median" and "dominant"
+    look at all the pixels it covers, see faceColors. faces too small
+    to cover a pixel fall back to their centre
+    """
+    if mode == "centre":
+        return sampleColors(img, centers)
+
+    labels = labelImage(mesh, img.size, offset)
+    colors, counts = faceColors(img, labels, len(mesh), mode)
+    del labels
+
+    empty = np.flatnonzero(counts == 0)
+    if len(empty):
+        colors[empty] = sampleColors(img, centers[empty])
+    return colors
+
+
+def polyMesh(width, height, img, points, wshift, hshift, pic=False,
+             colors=None, mode="centre"):
+    """ mesh of the points coloured the way genPoly colours them """
+    mesh = asMesh(points)
+
+    if colors is None:
+        centers = polyCenters(mesh, width, height, wshift, hshift)
+        offset = (0, 0)
+        if pic:
+            centers -= (wshift, hshift)
+            offset = (wshift, hshift)
+        colors = sampleFaces(img, mesh, centers, offset, mode)
+
+    return mesh.withColors(colors)
+
+
+def genPoly(width, height, img, points, wshift, hshift, outl=None, pic=False,
+            colors=None, mode="centre"):
+    """
+    the points are laid out on a canvas padded by wshift and hshift on
+    every side, they are drawn moved back onto a width x height canvas.
+    img is the padded background, or the picture itself when pic is set.
+    mode is how the triangles take their colour from img, see sampleFaces
+    """
+
+    mesh = polyMesh(width, height, img, points, wshift, hshift, pic, colors,
+                    mode)
+
+    baseImg = canvases.image("RGB", (width, height))
+    # only shows where no triangle lands, the padded canvas did the same
+    baseImg.paste(img, box=(0, 0))
+
+    offset = (wshift, hshift)
+    index = clipFaces(mesh, (0, 0, width, height), offset)
+    drawMesh(baseImg, mesh, outl, offset, index)
+
+    return baseImg
+
+
+def repaintPoly(img, points, old_colors, new_colors, wshift, hshift,
+                outl=None):
+    """
+    repaint an image made by genPoly with a new set of triangle colours,
+    only the triangles whose colour actually changed are drawn again
+    """
+
+    changed = np.flatnonzero(np.any(old_colors != new_colors, axis=1))
+    # same placement as genPoly
+    drawMesh(img, asMesh(points).withColors(new_colors), outl,
+             offset=(wshift, hshift), index=changed)
+
+    return changed
+
+
+def renderBands(size, mesh, background, outl=None, offset=(0, 0), scale=1,
+                rows=BAND_ROWS):
+    """
+    draw the coloured mesh on a size canvas one band of rows at a time and
+    yield every band shrunk by scale, the same pixels as drawing it whole
+    and resizing it with BICUBIC. background(top, bottom) gives those rows
+    of the canvas behind the mesh, as an image that can be drawn on. a
+    band is only valid until the next one is asked for
+    """
+
+    width, height = size
+    out_w, out_h = width // scale, height // scale
+    # bicubic reads two output pixels around every pixel it makes
+    pad = 3 * scale if scale > 1 else 0
+
+    xy = mesh.vertices[mesh.faces][..., 1] - offset[1]
+    lo, hi = xy.min(axis=1), xy.max(axis=1)
+    del xy
+
+    for y in range(0, out_h, rows):
+        n = min(rows, out_h - y)
+        # canvas rows of this band, same mapping as Image.resize
+        top = max(int(y * height / out_h) - pad, 0)
+        bottom = min(int(-(-(y + n) * height // out_h)) + pad, height)
+
+        band = background(top, bottom)
+        index = np.flatnonzero((hi >= top - 1) & (lo <= bottom + 1))
+        drawMesh(band, mesh, outl, (offset[0], offset[1] + top), index)
+
+        if scale == 1:
+            yield band
         else:
-            draw.polygon(tp, fill=c)  # draw one triangle
-
-    img = baseImg.crop((wshift, hshift, baseImg.width - wshift,
-                        baseImg.height - hshift))  # crop back to normal size
-
-    return img
+            yield band.resize((out_w, n), resample=Image.BICUBIC,
+                              box=(0, y * height / out_h - top, width,
+                                   (y + n) * height / out_h - top))
+        canvases.give(band)
+
+
+def fillShapes(img, mesh, centers, outl=None, workers=1):
+    """
+    colour every face of mesh from img and draw it back onto img, in
+    bands over several processes when workers is not 1. the colours are
+    RGB, so other pictures (grayscale, palette) are drawn on an RGB copy
+    """
+    if img.mode != "RGB":
+        img = img.convert("RGB")
+    mesh = mesh.withColors(sampleColors(img, centers))
+    if workers == 1:
+        return drawMesh(img, mesh, outl)
+    return drawMeshBands(img, mesh, outl, workers)
 
 
 ###########
 # diamond #
 ###########
 
-def genDiamond(width, height, img, outl=None, pic=False, per=1):
+def diamondMesh(width, height, per=1):
 
-    x = y = 0
     per = per / 5  # more percentage is too small
 
     wboxes = int(per / 100.0 * width)
     hboxes = int(per / 100.0 * height)
 
-    idata = img.load()  # load pixel data
-    draw = ImageDraw.Draw(img)
-
     inc = width // wboxes  # increment size
 
     wboxes += 2
     hboxes += 2
 
-    for i in range(hboxes - 1):  # one extra line
-        for j in range(wboxes // 2 - 1):  # ¯\_(ツ)_/¯
-
-            points = [(x, y), (x + inc, y + inc), (x + 2 * inc, y),
-                      (x + inc, y - inc)]  # diamond
-
-            a, b = (x + x + 2 * inc) // 2, y
-
-            try:  # adj to not overflow
-                b = height - 2 if b >= height else b
-                b = 2 if b <= 0 else b
+    rows = np.arange(hboxes - 1)  # one extra line
+    cols = np.arange(wboxes // 2 - 1)  # ¯\_(ツ)_/¯
 
-                a = width - 2 if a >= width else a
-                a = 2 if a <= 0 else a
+    # every other row starts half a diamond to the left
+    x = (np.where(rows % 2, -inc, 0)[:, None] + 2 * inc * cols).ravel()
+    y = np.repeat(rows * inc, len(cols))
 
-                c = idata[a, b]
+    corners = np.stack(((x, y), (x + inc, y + inc), (x + 2 * inc, y),
+                        (x + inc, y - inc))).transpose(2, 0, 1)  # diamond
+    centers = clampCenters(np.column_stack((x + inc, y)).astype(float),
+                           width, height, 2)
 
-            except Exception:
-                # print(a,b)
-                c = "#00ff00"  # backup
+    return Mesh.fromCorners(corners), centers
 
-            if outl:
-                draw.polygon((points), fill=c, outline=outl)
-            else:
-                draw.polygon((points), fill=c)
-            x += 2 * inc
-
-        y += inc
-
-        if i % 2 == 0:
-            x = -inc
-        else:
-            x = 0
 
-    return img  # return final image
+def genDiamond(width, height, img, outl=None, pic=False, per=1,
+               workers=1):
+    mesh, centers = diamondMesh(width, height, per)
+    return fillShapes(img, mesh, centers, outl, workers)  # return final image
 
 
 ###########
 # SQUARES #
 ###########
 
-def genSquares(width, height, img, outl=None, pic=False, per=1):
+def squaresMesh(width, height, per=1):
 
-    x = y = 0
     per = per / 5  # more percentage is too small
 
     wboxes = int(per / 100.0 * width)
     hboxes = int(per / 100.0 * height)
 
-    idata = img.load()  # load pixel data
-    draw = ImageDraw.Draw(img)
-
     inc = width // wboxes  # increment size
 
     wboxes += 1
     hboxes += 1
 
-    for i in range(hboxes):
-        for j in range(wboxes):
-            points = [(x, y), (x, y + inc), (x + inc, y + inc),
-                      (x + inc, y)]  # squares
-
-            a, b = (x + x + inc) // 2, (y + y + inc) // 2  # to get pixel data
-            try:  # adj to not overflow
-                b = height - 5 if b >= height else b
-                b = 5 if b <= 0 else b
-
-                a = width - 5 if a >= width else a
-                a = 5 if a <= 0 else a
-
-                c = idata[a, b]
+    # squares share the corners of a grid
+    gx, gy = np.meshgrid(np.arange(wboxes + 1) * inc,
+                         np.arange(hboxes + 1) * inc)
+    vertices = np.column_stack((gx.ravel(), gy.ravel()))
 
-            except Exception:
-                # print(a,b)
-                c = "#00ff00"  # backup
+    n = np.arange(vertices.shape[0]).reshape(hboxes + 1, wboxes + 1)
+    faces = np.stack((n[:-1, :-1], n[1:, :-1], n[1:, 1:], n[:-1, 1:]),
+                     axis=-1).reshape(-1, 4)
 
-            # draw one square
+    # to get pixel data
+    centers = (vertices[faces[:, 0]] * 2 + inc) // 2
+    centers = clampCenters(centers.astype(float), width, height, 5)
 
-            if outl:
-                draw.polygon((points), fill=c, outline=outl)
-            else:
-                draw.polygon((points), fill=c)
+    return Mesh(vertices, faces), centers
 
-            x += inc  # shift cursor horizontally
 
-        y += inc  # shift cursor vertically
-        x = 0  # restore horizontal starting point
-
-    return img  # return final image
+def genSquares(width, height, img, outl=None, pic=False, per=1,
+               workers=1):
+    mesh, centers = squaresMesh(width, height, per)
+    return fillShapes(img, mesh, centers, outl, workers)  # return final image
 
 
 ###########
 # HEXAGON #
 ###########
 
-def genHexagon(width, height, img, outl=None, pic=False, per=1):
-
-    per = 11 - per
-    x = y = 0
+def hexGrid(width, height, radius, pic=False, first=-1):
+    """
+    centres of a honeycomb of hexagons of this radius covering the image,
+    with the geometry of the hexagons
+    """
 
-    radius = int(per / 100.0 * min(height, width)) // 2
-
-    idata = img.load()  # load pixel data
-    draw = ImageDraw.Draw(img)
-
-    ang = 2 * math.pi / 6  # angle inside a hexagon
     apothem = radius * math.cos(math.pi / 6)  # radius of inner circle
     side = 2 * apothem * math.tan(math.pi / 6)  # length of each side
     hexwidth = 2 * apothem  # horizontal width of a hexagon
     wboxes = width // int(hexwidth)  # adj
     hboxes = height // int((side + radius) * 0.75)  # adj
 
-    xback = 0  # backup of x
-    x, y = xback + apothem, -(side / 2)  # start here
-
     if pic:
         hboxes += 1
 
-    for i in range(-1, hboxes + 1):
-        for j in range(-1, wboxes + 2):
-            points = [((x + radius * math.sin(k * ang)),
-                       (y + radius * math.cos(k * ang))) for k in range(6)]
+    rows = np.arange(-1, hboxes + 1)
+    cols = np.arange(wboxes + 2 - first)
 
-            a, b = x, y
-            try:  # adj to not overflow
-                b = b - side // 2 if b >= height else b
-                b = b + side // 2 if b <= 0 else b
+    # odd rows are shifted for honeycombing
+    x = np.where(rows % 2, apothem, 0)[:, None] + hexwidth * cols
+    y = -(side / 2) + (rows + 1) * (radius + (side / 2))
+    y = np.repeat(y, len(cols))
 
-                a = a - radius if a >= width else a
-                a = a + radius if a <= 0 else a
+    return np.column_stack((x.ravel(), y)), side
 
-                c = idata[a, b]
 
-            except Exception:
-                # print(a,b)
-                c = "#00ff00"  # backup
+def hexCorners(centers, radius):
+    """ (hexagons, 6, 2) corners around every centre """
+    ang = 2 * math.pi / 6  # angle inside a hexagon
+    k = np.arange(6) * ang
+    offsets = np.column_stack((radius * np.sin(k), radius * np.cos(k)))
+    return centers[:, None, :] + offsets
 
-            if outl:
-                # draw one hexagon
-                draw.polygon((points), fill=c, outline=outl)
-            else:
-                draw.polygon((points), fill=c)  # draw one hexagon
-            x += hexwidth
 
-        y += radius + (side / 2)  # shift cursor vertically
-        if i % 2 == 0:
-            x = xback + apothem  # restore horizontal starting point
-        else:
-            x = xback  # restore horizontal starting point, for honeycombing
+def hexagonMesh(width, height, per=1, pic=False):
+
+    per = 11 - per
+
+    radius = int(per / 100.0 * min(height, width)) // 2
+
+    centers, side = hexGrid(width, height, radius, pic)
+    corners = hexCorners(centers, radius)
+
+    a, b = centers[:, 0].copy(), centers[:, 1].copy()
+    # adj to not overflow
+    b = np.where(b >= height, b - side // 2, b)
+    b = np.where(b <= 0, b + side // 2, b)
+    a = np.where(a >= width, a - radius, a)
+    a = np.where(a <= 0, a + radius, a)
+
+    return Mesh.fromCorners(corners), np.column_stack((a, b)).astype(np.int32)
 
-    return img  # return final image
+
+def genHexagon(width, height, img, outl=None, pic=False, per=1,
+               workers=1):
+    mesh, centers = hexagonMesh(width, height, per, pic)
+    return fillShapes(img, mesh, centers, outl, workers)  # return final image
 
 #############
 # ISOMETRIC #
 #############
 
 
-def genIsometric(width, height, img, outl=None, pic=False, per=1):
+def isometricMesh(width, height, per=1, pic=False):
 
     per = 11 - per
-    x = y = 0
 
     radius = int(per / 100.0 * min(height, width))
 
-    idata = img.load()  # load pixel data
-    draw = ImageDraw.Draw(img)
+    centers, side = hexGrid(width, height, radius, pic, first=0)
+    corners = hexCorners(centers, radius)
 
-    ang = 2 * math.pi / 6  # angle inside a hexagon
-    apothem = radius * math.cos(math.pi / 6)  # radius of inner circle
-    side = 2 * apothem * math.tan(math.pi / 6)  # length of each side
-    hexwidth = 2 * apothem  # horizontal width of a hexagon
-    wboxes = width // int(hexwidth)  # adj
-    hboxes = height // int((side + radius) * 0.75)  # adj
+    # every hexagon is made of 6 equilateral triangles, sharing its centre
+    vertices = np.concatenate((centers[:, None, :], corners), axis=1)
+    base = np.arange(len(centers))[:, None, None] * 7
+    k = np.arange(-5, 1) % 6 + 1  # corners k and k + 1, from k = -5
+    tris = np.stack((np.zeros(6, dtype=int), k, k % 6 + 1), axis=1)
+    faces = (base + tris).reshape(-1, 3)
 
-    xback = 0  # backup of x
-    x, y = xback + apothem, -(side / 2)  # start here
+    vertices = vertices.reshape(-1, 2)
+    pts = vertices[faces]
+    # calculating centre of individual triangles, see calcCenter
+    tri_centers = (pts[:, 0] + pts[:, 1]) / 4 + pts[:, 2] / 2
 
-    if pic:
-        hboxes += 1
+    return Mesh(vertices, faces), clampCenters(tri_centers, width, height, 1)
 
-    for i in range(-1, hboxes + 1):
-        for j in range(wboxes + 2):
-            points = [((x + radius * math.sin(k * ang)),
-                       (y + radius * math.cos(k * ang))) for k in range(6)]
-            # to store the vertices of the individual equilateral triangles
-            # that make up a hexagon
-            triangle_points = []
-            c = []  # store center colors of each equilateral triangle
-            for k in range(-5, 1):
-                # storing vertices of individual triangles
-                triangle_points.append([(x, y), points[k], points[k + 1]])
-                # calculating centre of individual triangles
-                a, b = calcCenter([(x, y), points[k], points[k + 1]])
-                try:  # adj to not overflow
-                    b = height - 1 if b >= height else b
-                    b = 1 if b <= 0 else b
-
-                    a = width - 1 if a >= width else a
-                    a = 1 if a <= 0 else a
-
-                    c.append(idata[a, b])  # setting the color of the triangle
-
-                except Exception:
-                    # print(a,b)
-                    c.append("#00ff00")  # backup
-
-            if outl:
-                for k in range(6):
-                    # draw 6 triangles that form a hexagon
-                    draw.polygon((triangle_points[k]), fill=c[k], outline=outl)
-            else:
-                for k in range(6):
-                    # draw 6 triangles that form a hexagon
-                    draw.polygon((triangle_points[k]), fill=c[k])
-            x += hexwidth
-
-        y += radius + (side / 2)  # shift cursor vertically
-        if i % 2 == 0:
-            x = xback + apothem  # restore horizontal starting point
-        else:
-            x = xback  # restore horizontal starting point, for honeycombing
 
-    return img  # return final image
+def genIsometric(width, height, img, outl=None, pic=False, per=1,
+                 workers=1):
+    mesh, centers = isometricMesh(width, height, per, pic)
+    return fillShapes(img, mesh, centers, outl, workers)  # return final image
 
 #############
 # TRIANGLES #
 #############
 
 
-def genTriangle(width, height, img, outl=None, pic=False, per=1):
+def triangleMesh(width, height, per=1):
 
-    x = y = 0
     per = per / 5  # more percentage is too small
 
     wboxes = int(per / 100.0 * width)
     hboxes = int(per / 100.0 * height)
 
-    idata = img.load()  # load pixel data
-    draw = ImageDraw.Draw(img)
-
     inc = width // wboxes  # increment size
 
     wboxes += 1
     hboxes += 1
 
-    pair = 0
-    for i in range(hboxes * 2):
-        for j in range(wboxes):
+    rows = np.arange(hboxes * 2)
+    cols = np.arange(wboxes)
 
-            if i % 2 == 0:
-                # triangle pointing down
-                points = [(x, y), (x + inc * 2, y), (x + inc, y + inc)]
-            else:
-                # triangle pointing up
-                points = [(x, y), (x + inc, y - inc), (x + inc * 2, y)]
+    # rows come in pairs sharing the same y, pointing down then up
+    x = (np.where(rows % 2, -inc, 0)[:, None] + 2 * inc * cols).ravel()
+    y = np.repeat((rows + 1) // 2 * inc, len(cols))
+    down = np.repeat(rows % 2 == 0, len(cols))[:, None, None]
 
-            a, b = calcCenter(points)
+    # triangle pointing down
+    corners_down = np.stack(((x, y), (x + inc * 2, y), (x + inc, y + inc)))
+    # triangle pointing up
+    corners_up = np.stack(((x, y), (x + inc, y - inc), (x + inc * 2, y)))
+    corners = np.where(down, corners_down.transpose(2, 0, 1),
+                       corners_up.transpose(2, 0, 1))
 
-            try:  # adj to not overflow
-                b = height - 5 if b >= height else b
-                b = 5 if b <= 0 else b
+    centers = (corners[:, 0] + corners[:, 1]) / 4 + corners[:, 2] / 2
 
-                a = width - 5 if a >= width else a
-                a = 5 if a <= 0 else a
+    return Mesh.fromCorners(corners), clampCenters(centers, width, height, 5)
 
-                c = idata[a, b]
 
-            except Exception:
-                # print(a,b)
-                c = "#00ff00"  # backup
+def genTriangle(width, height, img, outl=None, pic=False, per=1,
+                workers=1):
+    mesh, centers = triangleMesh(width, height, per)
+    return fillShapes(img, mesh, centers, outl, workers)  # return final image
 
-            # draw one triangle
 
-            if outl:
-                draw.polygon((points), fill=c, outline=outl)
-            else:
-                draw.polygon((points), fill=c)
+SHAPES = {
+    'sq': genSquares,
+    'hex': genHexagon,
+    'dia': genDiamond,
+    'tri': genTriangle,
+    'iso': genIsometric,
+}
 
-            x += inc * 2  # shift cursor horizontally
+SHAPE_MESHES = {
+    'sq': squaresMesh,
+    'hex': hexagonMesh,
+    'dia': diamondMesh,
+    'tri': triangleMesh,
+    'iso': isometricMesh,
+}
 
-        pair += 1
-        if pair != 2:
-            y += inc  # shift cursor vertically
-        else:
-            pair = 0
-
-        if i % 2 == 0:
-            x = -inc
-        else:
-            x = 0
 
-    return img  # return final image
+def shapeMesh(shape, width, height, img, per=1):
+    """ mesh of a shape coloured the way its genX function colours it """
+    mesh, centers = SHAPE_MESHES[shape](width, height, per)
+    return mesh.withColors(sampleColors(img, centers))
@@ -0,0 +1,157 @@
+import io
+import os
+import atexit
+import threading
+from collections import namedtuple
+from multiprocessing import shared_memory
+
+CHUNK = 1 << 20  # buffers are allocated in whole MBs so they can be reused
+KEEP = 4  # idle buffers kept by a pool
+LIMIT = 128 * 2**20  # bytes of idle buffers kept at most
+SHM_DIR = "/dev/shm"  # where linux keeps shared memory, docker gives it 64MB
+
+# an encoded image left in a shared buffer, or sent back as data when
+# there was no room for one
+Frame = namedtuple("Frame", "length format data", defaults=(None,))
+
+
+def encodedBound(width, height, channels=3):
+    """ worst case size of an image encoded as PNG """
+    raw = width * height * channels
+    # a filter byte per row, zlib stored blocks and chunk headers
+    return raw + height + (raw // 16000 + 1) * 20 + 4096
+
+
+class BufferPool:
+    """
+    shared memory buffers handed to other processes and taken back once
+    their contents are read, so steady state requests reuse the same
+    segments instead of allocating new ones. a buffer is only made when
+    the shared memory filesystem has room for all of it, writing into one
+    it has no room for kills the writer with a SIGBUS
+    """
+
+    def __init__(self, keep=KEEP, limit=LIMIT):
+        self.keep = keep
+        self.limit = limit
+        self.free = []
+        self.lent = 0  # bytes of buffers taken, maybe not written yet
+        self.lock = threading.Lock()
+        atexit.register(self.close)
+
+    def take(self, nbytes):
+        """ a buffer of at least nbytes, None when there is no room """
+        with self.lock:
+            fits = [shm for shm in self.free if shm.size >= nbytes]
+            if fits:
+                shm = min(fits, key=lambda s: s.size)
+                self.free.remove(shm)
+                self.lent += shm.size
+                return shm
+
+            size = max(-(-nbytes // CHUNK), 1) * CHUNK
+            room = shmRoom()
+            if room is not None and room - self.lent < size:
+                # idle buffers are written, they count against the room
+                idle, self.free = self.free, []
+                for shm in idle:
+                    release(shm)
+                room = shmRoom()
+                if room - self.lent < size:
+                    return None
+            self.lent += size
+
+        try:
+            return shared_memory.SharedMemory(create=True, size=size)
+        except OSError:
+            with self.lock:
+                self.lent -= size
+            return None
+
+    def give(self, shm):
+        """ return a buffer taken from the pool, None is ignored """
+        if shm is None:
+            return
+        with self.lock:
+            self.lent -= shm.size
+            self.free.append(shm)
+            drop = []
+            # drop the smallest, big requests are the costly ones to serve
+            while len(self.free) > self.keep or \
+                    sum(s.size for s in self.free) > self.limit:
+                drop.append(min(self.free, key=lambda s: s.size))
+                self.free.remove(drop[-1])
+        for shm in drop:
+            release(shm)
+
+    def close(self):
+        with self.lock:
+            free, self.free = self.free, []
+        for shm in free:
+            release(shm)
+
+
+def shmRoom():
+    """ free bytes of the shared memory filesystem, None if unknown """
+    try:
+        st = os.statvfs(SHM_DIR)
+    except OSError:
+        return None
+    return st.f_bavail * st.f_frsize
+
+
+def release(shm):
+    shm.close()
+    try:
+        shm.unlink()
+    except FileNotFoundError:
+        pass
+
+
+class BufferWriter(io.RawIOBase):
+    """ file object writing into a fixed size buffer """
+
+    def __init__(self, buf):
+        self.buf = buf
+        self.pos = 0
+
+    def writable(self):
+        return True
+
+    def tell(self):
+        return self.pos
+
+    def write(self, b):
+        n = len(b)
+        if self.pos + n > len(self.buf):
+            raise ValueError("Image does not fit in the shared buffer")
+        self.buf[self.pos:self.pos + n] = b
+        self.pos += n
+        return n
+
+
+def writeImage(name, img, format="PNG", **params):
+    """
+    encode img into the shared buffer called name, or into the frame
+    itself when name is None
+    """
+    if name is None:
+        out = io.BytesIO()
+        img.save(out, format=format, **params)
+        return Frame(out.tell(), format, out.getvalue())
+
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        out = BufferWriter(shm.buf)
+        img.save(out, format=format, **params)
+        out.buf = None
+        return Frame(out.pos, format)
+    finally:
+        shm.close()
+
+
+def frameBytes(shm, frame):
+    """ memoryview of the result, release it before giving shm back """
+    if frame.data is not None:
+        return memoryview(frame.data)
+    return shm.buf[:frame.length]
@@ -1,12 +1,24 @@
 import sys
+import json
 import time
 import click
-import numpy as np
-from skimage import color
+import functools
+from tools import api, bench  # noqa: F401, api is the library interface
+from tools.profiler import Profile, cprofiled
 from tools.wallpaper import setwallpaper
+from tools.picture import (
+    edgeProxy,
+    openPicture)
 from tools.points import (
-    genPoints,
-    genSmartPoints)
+    MAX_POINTS,
+    budgetPoints,
+    conditionPoints,
+    genSmartPoints,
+    randomPoints,
+    triangulate)
+from tools.labels import MODES
+from tools.palette import applyPalette, flatPalette
+from tools.pngstream import writeBands
 from tools.gradient import (
     Image,
     NbyNGradient,
@@ -14,16 +26,115 @@ from tools.gradient import (
     random_gradient,
     swirl_image)
 from tools.shapes import (
+    SHAPES,
     drawSlants,
-    genDiamond,
-    genHexagon,
-    genIsometric,
     genPoly,
-    genSquares,
-    genTriangle)
+    polyMesh,
+    renderBands,
+    shapeMesh)
 
 CONTEXT_SETTINGS = dict(help_option_names=['-h', '--help'])
 
+# pictures are rendered at most this long, the widest wallpapers there are.
+# bounds the memory a huge photo takes to decode
+PIC_MAX_SIDE = 7680
+
+JOBS_OPTION = click.option(
+    "--jobs", "-j", default=1, metavar="N",
+    help="""Triangulate large point sets in strips over N processes.
+    Default=1. 0 means one per core""")
+
+PROFILE_OPTIONS = [
+    click.option("--profile", "-pr", is_flag=True,
+                 help="Print the time and memory used by every stage"),
+    click.option("--profile-json", metavar="/path/to/file.json",
+                 help="Write the time and memory of every stage as json"),
+    click.option("--cprofile", metavar="/path/to/file.prof",
+                 help="Write a cProfile dump of the run"),
+]
+
+
+PALETTE_OPTIONS = [
+    click.option("--palette", "-pl", is_flag=True,
+                 help="""Save an indexed colour PNG made of the colours of the
+                 shapes, much smaller and faster to write"""),
+    click.option("--ramps", "-rp", default=1, metavar="N",
+                 type=click.IntRange(0, 16),
+                 help="""With --palette, blend colours kept for the
+                 anti aliased edges between two shapes. Default=1"""),
+]
+
+
+def palette_options(f):
+    for option in reversed(PALETTE_OPTIONS):
+        f = option(f)
+    return f
+
+
+def keep_palette(img, palette, ramps, prof):
+    """ colour table of a flat shaded render, when --palette is given """
+    if not palette:
+        return None
+    with prof.stage("palette"):
+        return flatPalette(img, ramps)
+
+
+def use_palette(img, pal, prof):
+    if pal is None:
+        return img
+    with prof.stage("palette"):
+        return applyPalette(img, pal)
+
+
+def open_picture(image, max_size, prof):
+    """ open the picture, saying so when it had to be shrunk """
+    with prof.stage("open"):
+        img = openPicture(image, max_size)
+        img.load()
+    if img.size != img.info.get("full_size", img.size):
+        sys.stdout.flush()
+        click.secho("\nShrunk {}x{} picture to {}x{}".format(
+            *img.info["full_size"], *img.size), fg="yellow", err=True)
+    return img
+
+
+def save_bands(file_name, side, mesh, img, outl, offset, scale):
+    """
+    draw mesh over img a band at a time straight into the PNG file_name,
+    side is the size of the canvas before scaling it down
+    """
+
+    def background(top, bottom):
+        if img.height == 1:  # a strip of a left to right gradient
+            return img.crop((0, 0, side, 1)).resize(
+                (side, bottom - top), resample=Image.NEAREST)
+        return img.crop((0, top, side, bottom))
+
+    writeBands(file_name, (side // scale, side // scale),
+               renderBands((side, side), mesh, background, outl, offset,
+                           scale))
+
+
+def profiled(f):
+    """ add the profiling options to a command, which gets a Profile """
+
+    @functools.wraps(f)
+    def wrapper(*args, profile, profile_json, cprofile, **kwargs):
+        prof = Profile(enabled=bool(profile or profile_json))
+
+        with cprofiled(cprofile):
+            f(*args, prof=prof, **kwargs)
+
+        if profile:
+            click.echo(prof.table(), err=True)
+        if profile_json:
+            with open(profile_json, "w") as fp:
+                fp.write(prof.json())
+
+    for option in reversed(PROFILE_OPTIONS):
+        wrapper = option(wrapper)
+    return wrapper
+
 
 @click.group(context_settings=CONTEXT_SETTINGS)
 def cli():
@@ -45,13 +156,24 @@ def cli():
               help="Generate just a gradient image")
 @click.option("--use-nn", "-un", is_flag=True,
               help="Use NbyNGradient function")
+@click.option("--boxes", "-bx", default=5, metavar="N",
+              help="Boxes per side of the NbyNGradient. Default=5")
 @click.option("--swirl", "-sw", type=click.INT, metavar="STRENGTH",
               help="Swirl the gradient. [1-10]")
 @click.option("--scale", "-sc", default=2,
               help="""Scale image to do anti-aliasing. Default=2. scale=1 means
                no antialiasing. [WARNING: Very memory expensive]""")
+@click.option("--stream", "-st", is_flag=True,
+              help="""Render and write the image a band of rows at a time,
+              for images too big to keep in memory""")
+@JOBS_OPTION
+@click.option("--jitter", "-jt", default=0.0, metavar="PIXELS",
+              help="""Move every point by up to this much at random, below
+              0.5. Default=0""")
 @click.option("--set-wall", "-w", is_flag=True,
               help="Set the generated image as your Desktop wallpaper")
+@palette_options
+@profiled
 def poly(
         side,
         points,
@@ -61,9 +183,16 @@ def poly(
         name,
         only_color,
         use_nn,
+        boxes,
         swirl,
         scale,
-        set_wall):
+        stream,
+        jobs,
+        jitter,
+        set_wall,
+        palette,
+        ramps,
+        prof):
     """ Generates a HQ low poly image using a gradient """
 
     error = ""
@@ -71,10 +200,18 @@ def poly(
         error = "Image too small. Minimum size 50"
     elif points < 3:
         error = "Too less points. Minimum points 3"
-    elif points > 200000:
-        error = "Too many points. Maximum points 200000"
+    elif points > MAX_POINTS:
+        error = "Too many points. Maximum points {}".format(MAX_POINTS)
+    elif boxes < 1:
+        error = "Invalid number of boxes"
     elif scale < 1:
         error = "Invalid scale value"
+    elif stream and palette:
+        error = "--palette can not be used with --stream"
+    elif jobs < 0:
+        error = "Invalid number of jobs"
+    elif not 0 <= jitter < 0.5:
+        error = "Jitter must be at least 0 and below 0.5"
 
     if error:
         click.secho(error, fg='red', err=True)
@@ -85,24 +222,33 @@ def poly(
     shift = side // 10
     nside = side + shift * 2  # increase size to prevent underflow
 
+    stream = stream and not only_color
+    # streamed left to right gradients only need a single row
+    rows = 1 if stream and not swirl else None
+
     if colors:
         if len(colors) < 2:
             click.secho("One color gradient not possible.", fg="red", err=True)
             sys.exit(1)
         cs = [tuple(bytes.fromhex(c[1:])) for c in colors]
-        img = nGradient(nside, *cs)
+        with prof.stage("gradient"):
+            img = nGradient(nside, *cs, rows=rows)
     else:
         if use_nn:
             points = 1000 if points < 1000 else points
-            img = NbyNGradient(nside)
+            with prof.stage("gradient"):
+                img = NbyNGradient(nside, boxes)
         else:
-            img = random_gradient(nside)
+            with prof.stage("gradient"):
+                img = random_gradient(nside, rows=rows)
 
     if swirl:
         if only_color:
-            img = img.resize((side // scale, side // scale),
-                             resample=Image.BICUBIC)
-        img = swirl_image(img, swirl)
+            with prof.stage("resize"):
+                img = img.resize((side // scale, side // scale),
+                                 resample=Image.BICUBIC)
+        with prof.stage("swirl"):
+            img = swirl_image(img, swirl)
 
     if not only_color:
         if outline:
@@ -113,28 +259,49 @@ def poly(
                 sys.exit(1)
 
         print("Preparing image", end="")
-        pts = genPoints(points, nside, nside)
+        stats = {}
+        with prof.stage("points"):
+            pts = conditionPoints(randomPoints(points, nside, nside),
+                                  jitter, stats)
+        prof.count("removed", stats['removed'])
+        with prof.stage("triangulation"):
+            pts = triangulate(pts, jobs)
 
         print("\r", end="")
         print("Generated points", end="")
-        img = genPoly(side, side, img, pts, shift, shift, outl=outline)
-
-        print("\r", end="")
-        print("Making final tweaks", end="")
-        img = img.resize((side // scale, side // scale),
-                         resample=Image.BICUBIC)
-
-    if show:
+        if stream:
+            with prof.stage("fill"):
+                mesh = polyMesh(side, side, img, pts, shift, shift)
+        else:
+            with prof.stage("fill"):
+                img = genPoly(side, side, img, pts, shift, shift,
+                              outl=outline)
+            pal = keep_palette(img, palette, ramps, prof)
+
+            print("\r", end="")
+            print("Making final tweaks", end="")
+            with prof.stage("resize"):
+                img = img.resize((side // scale, side // scale),
+                                 resample=Image.BICUBIC)
+            img = use_palette(img, pal, prof)
+
+    if show and not stream:
         img.show()
 
-    file_name = ""
-
     if name:
         file_name = "{}.png".format(name)
-        img.save(file_name)
     else:
         file_name = "wall-{}.png".format(int(time.time()))
-        img.save(file_name)
+
+    if stream:
+        with prof.stage("stream"):
+            save_bands(file_name, side, mesh, img, outline, (shift, shift),
+                       scale)
+        if show:
+            Image.open(file_name).show()
+    else:
+        with prof.stage("save"):
+            img.save(file_name)
 
     print("\r", end="")
     print(f"Image is stored at {file_name}")
@@ -174,13 +341,23 @@ def poly(
               help="Rename the output file")
 @click.option("--use-nn", "-un", is_flag=True,
               help="Use NbyNGradient function")
+@click.option("--boxes", "-bx", default=5, metavar="N",
+              help="Boxes per side of the NbyNGradient. Default=5")
 @click.option("--swirl", "-sw", type=click.INT, metavar="STRENGTH",
               help="Swirl the gradient. [1-10]")
 @click.option("--scale", "-sc", default=2,
               help="""Scale image to do anti-aliasing. Default=2. scale=1 means
                no antialiasing. [WARNING: Very memory expensive]""")
+@click.option("--jobs", "-j", default=1, metavar="N",
+              help="""Draw the shapes in bands over N processes. Default=1.
+              0 means one per core""")
+@click.option("--stream", "-st", is_flag=True,
+              help="""Render and write the image a band of rows at a time,
+              for images too big to keep in memory""")
 @click.option("--set-wall", "-w", is_flag=True,
               help="Set the generated image as your Desktop wallpaper")
+@palette_options
+@profiled
 def shape(
         side,
         shape,
@@ -190,9 +367,15 @@ def shape(
         name,
         percent,
         use_nn,
+        boxes,
         swirl,
         scale,
-        set_wall):
+        jobs,
+        stream,
+        set_wall,
+        palette,
+        ramps,
+        prof):
     """ Generates a HQ image of a beautiful shapes """
 
     error = ""
@@ -201,27 +384,38 @@ def shape(
     if percent is not None:
         if percent < 1 or percent > 10:
             error = "Error {} : Percent range 1-10".format(percent)
+    if jobs < 0:
+        error = "Invalid number of jobs"
+    if boxes < 1:
+        error = "Invalid number of boxes"
+    if stream and palette:
+        error = "--palette can not be used with --stream"
 
     if error:
         click.secho(error, fg='red', err=True)
         sys.exit(1)
 
     side = side * scale  # increase size to anti alias
+    # streamed left to right gradients only need a single row
+    rows = 1 if stream and not swirl else None
 
     if colors:
         if len(colors) < 2:
             click.secho("One color gradient not possible.", fg="red", err=True)
             sys.exit(1)
         cs = [tuple(bytes.fromhex(c[1:])) for c in colors]
-        img = nGradient(side, *cs)
+        with prof.stage("gradient"):
+            img = nGradient(side, *cs, rows=rows)
     else:
-        if use_nn:
-            img = NbyNGradient(side)
-        else:
-            img = random_gradient(side)
+        with prof.stage("gradient"):
+            if use_nn:
+                img = NbyNGradient(side, boxes)
+            else:
+                img = random_gradient(side, rows=rows)
 
     if swirl:
-        img = swirl_image(img, swirl)
+        with prof.stage("swirl"):
+            img = swirl_image(img, swirl)
 
     if outline:
         try:
@@ -232,40 +426,48 @@ def shape(
 
     print("Preparing image", end="")
 
-    if shape == 'hex':
-        percent = percent if percent else 5
-        img = genHexagon(side, side, img, outline, per=(percent or 1))
-    elif shape == 'sq':
-        img = genSquares(side, side, img, outline, per=(percent or 1))
-    elif shape == 'dia':
-        img = genDiamond(side, side, img, outline, per=(percent or 1))
-    elif shape == 'tri':
-        img = genTriangle(side, side, img, outline, per=(percent or 1))
-    elif shape == 'iso':
-        img = genIsometric(side, side, img, outline, per=(percent or 1))
-    else:
+    if shape not in SHAPES:
         error = """
         No shape given. To see list of shapes \"wallgen shape --help\"
         """
         click.secho(error, fg='red', err=True)
         sys.exit(1)
 
-    print("\r", end="")
-    print("Making final tweaks", end="")
+    if shape == 'hex':
+        percent = percent if percent else 5
+    if stream:
+        with prof.stage("fill"):
+            mesh = shapeMesh(shape, side, side, img, per=(percent or 1))
+    else:
+        with prof.stage("fill"):
+            img = SHAPES[shape](side, side, img, outline, per=(percent or 1),
+                                workers=jobs)
+        pal = keep_palette(img, palette, ramps, prof)
 
-    img = img.resize((side // scale, side // scale), resample=Image.BICUBIC)
+        print("\r", end="")
+        print("Making final tweaks", end="")
 
-    if show:
-        img.show()
+        with prof.stage("resize"):
+            img = img.resize((side // scale, side // scale),
+                             resample=Image.BICUBIC)
+        img = use_palette(img, pal, prof)
 
-    file_name = ""
+    if show and not stream:
+        img.show()
 
     if name:
         file_name = "{}.png".format(name)
-        img.save(file_name)
     else:
         file_name = "wall-{}.png".format(int(time.time()))
-        img.save(file_name)
+
+    if stream:
+        with prof.stage("stream"):
+            save_bands(file_name, side, mesh, img, outline, (0, 0), scale)
+        if show:
+            Image.open(file_name).show()
+    else:
+        with prof.stage("save"):
+            img.save(file_name)
 
     print("\r", end="")
     print(f"Image is stored at {file_name}")
@@ -285,32 +487,31 @@ def shape(
               help="Swirl the gradient. [1-10]")
 @click.option("--set-wall", "-w", is_flag=True,
               help="Set the generated image as your Desktop wallpaper")
-def slants(side, show, name, swirl, set_wall):
+@profiled
+def slants(side, show, name, swirl, set_wall, prof):
     """ Generates slanting lines of various colors """
 
-    scale = 2
-    side = side * scale  # increase size to anti alias
     print("Preparing image", end="")
 
-    img = drawSlants(side)
+    with prof.stage("fill"):
+        img = drawSlants(side)  # anti aliased, no need to scale
 
     print("\r", end="")
     print("Making final tweaks", end="")
-    img = img.resize((side // scale, side // scale), resample=Image.BICUBIC)
 
     if swirl:
-        img = swirl_image(img, swirl)
+        with prof.stage("swirl"):
+            img = swirl_image(img, swirl)
 
     if show:
         img.show()
 
-    file_name = ""
-
     if name:
         file_name = "{}.png".format(name)
-        img.save(file_name)
     else:
         file_name = "wall-{}.png".format(int(time.time()))
+
+    with prof.stage("save"):
         img.save(file_name)
 
     print("\r", end="")
@@ -323,6 +524,42 @@ def slants(side, show, name, swirl, set_wall):
             click.secho(msg, fg="red")
 
 
+@cli.command("bench")
+@click.option("--command", "-c", "commands", multiple=True,
+              type=click.Choice(bench.COMMANDS),
+              help="Command to benchmark, can be repeated. Default all")
+@click.option("--size", "-s", "sides", multiple=True, type=click.INT,
+              metavar="PIXELS", help="Image size to use, can be repeated")
+@click.option("--points", "-p", multiple=True, type=click.INT,
+              metavar="no-of-points",
+              help="Number of points for poly, can be repeated")
+@click.option("--repeat", "-r", default=bench.REPEAT,
+              help="Runs of every case, default = {}".format(bench.REPEAT))
+@click.option("--seed", default=bench.SEED, help="Random seed")
+@click.option("--name", "-n", metavar="/path/to/output_file",
+              help="Write the results to this json file")
+def bench_cmd(commands, sides, points, repeat, seed, name):
+    """ Time every stage of every generator """
+
+    def progress(result):
+        variant = result.get('points', result.get('shape', ''))
+        total = result['stages']['total']['median']
+        click.echo("{} {} {}: {:.3f}s".format(
+            result['command'], result['side'], variant, total), err=True)
+
+    results = bench.bench(commands or bench.COMMANDS,
+                          sides or bench.SIDES,
+                          points or bench.POINTS,
+                          repeat, seed, progress)
+
+    if name:
+        with open("{}.json".format(name), "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results are stored at {name}.json")
+    else:
+        print(json.dumps(results, indent=2))
+
+
 @cli.group()
 def pic():
     """ Use a picture instead of a gradient """
@@ -338,15 +575,36 @@ def pic():
 @click.option("--name", "-n", metavar="/path/to/output_file",
               help="Rename the output file")
 @click.option("--smart", "-sm", is_flag=True, help="Use smart points")
+@click.option("--time-budget", "-tb", type=click.FLOAT, metavar="SECONDS",
+              help="""With --smart, choose the number of points to render in
+              about this much time""")
+@click.option("--max-size", "-ms", default=PIC_MAX_SIDE, metavar="PIXELS",
+              help="""Shrink larger pictures to this size on the longest side,
+              JPEGs are decoded at a reduced scale then. Default={}, 8K.
+              0 means no limit""".format(PIC_MAX_SIDE))
+@click.option("--sample", "-sa", default="centre", type=click.Choice(MODES),
+              help="""How the triangles take their colour from the picture,
+              the pixel at their centre or the mean, median or most common
+              colour of all their pixels. Default=centre""")
+@JOBS_OPTION
 @click.option("--set-wall", "-w", is_flag=True,
               help="Set the generated image as your Desktop wallpaper")
-def poly(image, points, show, outline, name, smart, set_wall):  # noqa: F811
+@click.pass_context
+@palette_options
+@profiled
+def poly(ctx, image, points, show, outline, name, smart,  # noqa: F811
+         time_budget, max_size, sample, jobs, set_wall, palette, ramps,
+         prof):
     """ Generates a HQ low poly image """
 
     if points < 3:
         error = "Too less points. Minimum points 3"
-    elif points > 200000:
-        error = "Too many points. Maximum points {}".format(200000)
+    elif points > MAX_POINTS:
+        error = "Too many points. Maximum points {}".format(MAX_POINTS)
+    elif jobs < 0:
+        error = "Invalid number of jobs"
+    elif time_budget is not None and time_budget <= 0:
+        error = "Invalid time budget"
     else:
         error = None
 
@@ -368,7 +626,7 @@ def poly(image, points, show, outline, name, smart, set_wall):  # noqa: F811
 
     print("Preparing image", end="")
 
-    img = Image.open(image)
+    img = open_picture(image, max_size, prof)
     width = img.width
     height = img.height
     wshift = width // 100
@@ -378,18 +636,41 @@ def poly(image, points, show, outline, name, smart, set_wall):  # noqa: F811
     n_height = height + 2 * hshift
 
     if smart:
-        # Sobel Edge
-        ski_img = np.array(img)
-        gray_img = color.rgb2gray(ski_img)
-        pts = genSmartPoints(gray_img)
+        # smart points only follow --points when it is given explicitly
+        qty = None
+        if time_budget:
+            qty = min(budgetPoints(time_budget, width, height), MAX_POINTS)
+        elif ctx.get_parameter_source("points") != \
+                click.core.ParameterSource.DEFAULT:
+            qty = points
+
+        # Sobel Edge, on a reduced copy of the picture
+        stats = {}
+        with prof.stage("proxy"):
+            gray_img = edgeProxy(img)
+        pts = genSmartPoints(gray_img, size=(width, height), qty=qty,
+                             stats=stats, workers=jobs)
+        prof.add("edges", stats['edges'])
+        prof.add("points", stats['sample'])
+        prof.add("triangulation", stats['delaunay'])
+        prof.count("removed", stats['removed'])
     else:
-        pts = genPoints(points, n_width, n_height)
+        stats = {}
+        with prof.stage("points"):
+            pts = conditionPoints(randomPoints(points, n_width, n_height),
+                                  stats=stats)
+        prof.count("removed", stats['removed'])
+        with prof.stage("triangulation"):
+            pts = triangulate(pts, jobs)
 
     print("\r", end="")
     print("Generated points", end="")
 
-    final_img = genPoly(img.width, img.height, img, pts,
-                        wshift, hshift, outline, pic=True)
+    with prof.stage("fill"):
+        final_img = genPoly(img.width, img.height, img, pts,
+                            wshift, hshift, outline, pic=True, mode=sample)
+    final_img = use_palette(
+        final_img, keep_palette(final_img, palette, ramps, prof), prof)
 
     print("\r", end="")
     print("Making final tweaks", end="")
@@ -397,13 +678,12 @@ def poly(image, points, show, outline, name, smart, set_wall):  # noqa: F811
     if show:
         final_img.show()
 
-    file_name = ""
-
     if name:
         file_name = "{}.png".format(name)
-        final_img.save(file_name)
     else:
         file_name = "wall-{}.png".format(int(time.time()))
+
+    with prof.stage("save"):
         final_img.save(file_name)
 
     print("\r", end="")
@@ -443,20 +723,32 @@ def poly(image, points, show, outline, name, smart, set_wall):  # noqa: F811
               "-n",
               metavar="/path/to/output_file",
               help="Rename the output")
+@click.option("--max-size", "-ms", default=PIC_MAX_SIDE, metavar="PIXELS",
+              help="""Shrink larger pictures to this size on the longest side,
+              JPEGs are decoded at a reduced scale then. Default={}, 8K.
+              0 means no limit""".format(PIC_MAX_SIDE))
+@click.option("--jobs", "-j", default=1, metavar="N",
+              help="""Draw the shapes in bands over N processes. Default=1.
+              0 means one per core""")
 @click.option("--set-wall", "-w", is_flag=True,
               help="Set the generated image as your Desktop wallpaper")
-def shape(image, shape, show, outline, name, percent, set_wall):  # noqa: F811
+@palette_options
+@profiled
+def shape(image, shape, show, outline, name, percent,  # noqa: F811
+          max_size, jobs, set_wall, palette, ramps, prof):
     """ Generate a HQ image of a beautiful shapes """
     error = None
     if percent:
         if percent < 1 or percent > 10:
             error = "Percent range 1-10"
+    if jobs < 0:
+        error = "Invalid number of jobs"
 
     if error:
         click.secho(error, fg='red', err=True)
         sys.exit(1)
 
-    img = Image.open(image)
+    img = open_picture(image, max_size, prof)
 
     width = img.width
     height = img.height
@@ -470,37 +762,32 @@ def shape(image, shape, show, outline, name, percent, set_wall):  # noqa: F811
 
     print("Preparing image", end="")
 
-    if shape == 'hex':
-        percent = percent if percent else 5
-        img = genHexagon(width, height, img, outline, pic=True, per=percent)
-    elif shape == 'sq':
-        img = genSquares(width, height, img, outline, pic=True, per=percent)
-    elif shape == 'dia':
-        img = genDiamond(width, height, img, outline, pic=True, per=percent)
-    elif shape == 'tri':
-        img = genTriangle(width, height, img, outline, pic=True, per=percent)
-    elif shape == 'iso':
-        img = genIsometric(width, height, img, outline, pic=True, per=percent)
-    else:
+    if shape not in SHAPES:
         error = """
         No shape given. To see list of shapes \"wallgen pic shape --help\"
         """
         click.secho(error, fg='red', err=True)
         sys.exit(1)
 
+    if shape == 'hex':
+        percent = percent if percent else 5
+    with prof.stage("fill"):
+        img = SHAPES[shape](width, height, img, outline, pic=True,
+                            per=(percent or 1), workers=jobs)
+    img = use_palette(img, keep_palette(img, palette, ramps, prof), prof)
+
     print("\r", end="")
     print("Making final tweaks", end="")
 
     if show:
         img.show()
 
-    file_name = ""
-
     if name:
         file_name = "{}.png".format(name)
-        img.save(file_name)
     else:
         file_name = "wall-{}.png".format(int(time.time()))
+
+    with prof.stage("save"):
         img.save(file_name)
 
     print("\r", end="")